@@ -6,11 +6,8 @@ import streamlit as st
 import streamlit.components.v1 as components
 
 from streamlit_app.common.theme import apply_theme
-from streamlit_app.common.api_client import (
-    price_predict,
-    get_price_categories,
-    get_price_states
-)
+from streamlit_app.common.api_client import price_predict
+from streamlit_app.common.data_cache import price_options
 
 # =====================================================
 # PAGE CONFIG (MUST BE FIRST)
@@ -45,18 +42,21 @@ with c2:
 with c3:
     month = st.selectbox("Month", list(range(1, 13)))
 
+# cached across reruns and sessions, fetched concurrently on a miss (see data_cache)
+categories, states = price_options()
+
 c4, c5 = st.columns(2)
 
 with c4:
     category = st.selectbox(
         "Category",
-        get_price_categories()
+        categories
     )
 
 with c5:
     state = st.selectbox(
         "State",
-        get_price_states()
+        states
     )
 
 st.markdown("---")
@@ -6,35 +6,23 @@ import streamlit as st
 import streamlit.components.v1 as components
 
 from streamlit_app.common.theme import apply_theme
-from streamlit_app.common.api_client import recommend_by_sku, list_products
-
-from pathlib import Path
-import base64
-
-CROPS_DIR = Path("streamlit_app/assets/crops")
+from streamlit_app.common.api_client import recommend_by_sku
+from streamlit_app.common.data_cache import (
+    cached_gather,
+    list_products,
+    products_request,
+    recommend_request
+)
+from streamlit_app.common.assets import THUMB, crop_image_url
+from streamlit_app.common.grid import card, render_grid
 
 def get_product_image(product: dict):
     """
     Resolve product image from local assets/crops folder
-    using product category.
+    using product category (banana.jpg, groundnuts.jpg, etc.),
+    as a cached icon-sized thumbnail.
     """
-    category = product.get("category", "").lower().strip()
-
-    if not category:
-        return None
-
-    # Expected filename: banana.jpg, groundnuts.jpg, etc.
-    img_path = CROPS_DIR / f"{category}.jpg"
-
-    if not img_path.exists():
-        return None
-
-    with open(img_path, "rb") as f:
-        img_bytes = f.read()
-
-    b64 = base64.b64encode(img_bytes).decode()
-
-    return f"data:image/jpeg;base64,{b64}"
+    return crop_image_url(product.get("category", ""), THUMB)
 
 # =====================================================
 # PAGE CONFIG (MUST BE FIRST)
@@ -60,7 +48,19 @@ st.caption("ML-powered similarity-based recommendations")
 # =====================================================
 # LOAD PRODUCTS
 # =====================================================
-products = list_products()
+# On the rerun a click starts, the selection is already in session state, so
+# the catalogue and its recommendations are fetched together
+clicked_sku = st.session_state.get("selected_sku") if st.session_state.get("recommend") else None
+fetches = [products_request(fields="sku,display_name")]
+if clicked_sku is not None:
+    fetches.append(recommend_request(clicked_sku))
+try:
+    products, *recommended = cached_gather(*fetches)
+except Exception:
+    if clicked_sku is None:
+        raise
+    # the recommendation request failed; it is retried (and reported) below
+    products, recommended = list_products(fields="sku,display_name"), []
 sku_map = {p["sku"]: p["display_name"] for p in products}
 
 
@@ -70,18 +70,22 @@ sku_map = {p["sku"]: p["display_name"] for p in products}
 selected_sku = st.selectbox(
     "📦 Select a product",
     list(sku_map.keys()),
-    format_func=lambda x: sku_map[x]
+    format_func=lambda x: sku_map[x],
+    key="selected_sku"
 )
 
 
 # =====================================================
 # RECOMMEND
 # =====================================================
-if st.button("🔍 Get Recommendations", use_container_width=True):
+if st.button("🔍 Get Recommendations", use_container_width=True, key="recommend"):
 
     with st.spinner("Finding similar products..."):
         try:
-            result = recommend_by_sku(selected_sku)
+            if recommended and clicked_sku == selected_sku:
+                result = recommended[0]
+            else:
+                result = recommend_by_sku(selected_sku)
             recs = result.get("recommendations", [])
 
             st.subheader("🔗 Recommended Products")
@@ -89,6 +93,7 @@ if st.button("🔍 Get Recommendations", use_container_width=True):
             if not recs:
                 st.info("No similar products found.")
             else:
+                cards = []
                 for r in recs:
                     p = r.get("product")
                     if not p:
@@ -96,70 +101,17 @@ if st.button("🔍 Get Recommendations", use_container_width=True):
 
                     score = r.get("score", 0.0)
 
-                    # ---------------- CARD (SAFE HTML) ----------------
-                    img = get_product_image(p)
-
-                    img = get_product_image(p)
-
-                    components.html(
-                        f"""
-                        <div style="
-                            background:#0B3F43;
-                            padding:16px 18px;
-                            border-radius:16px;
-                            box-shadow:0 10px 26px rgba(11,63,67,0.55);
-                            margin-bottom:18px;
-                            color:#ECFEFF;
-                            display:flex;
-                            align-items:center;
-                            gap:14px;
-                            transition: transform 0.25s ease, box-shadow 0.25s ease;
-                        "
-                        onmouseover="
-                            this.style.transform='scale(1.04)';
-                            this.style.boxShadow='0 16px 36px rgba(11,63,67,0.75)';
-                        "
-                        onmouseout="
-                            this.style.transform='scale(1)';
-                            this.style.boxShadow='0 10px 26px rgba(11,63,67,0.55)';
-                        "
-                        >
-
-                            <!-- IMAGE -->
-                            <img src="{img}"
-                                 style="
-                                    width:56px;
-                                    height:56px;
-                                    border-radius:12px;
-                                    object-fit:cover;
-                                    flex-shrink:0;
-                                    box-shadow:0 4px 12px rgba(0,0,0,0.35);
-                                 " />
-
-                            <!-- TEXT -->
-                            <div>
-                                <div style="
-                                    font-size:1.05rem;
-                                    font-weight:600;
-                                    color:#D1FAF5;
-                                    margin-bottom:4px;
-                                ">
-                                    {p['display_name']}
-                                </div>
-
-                                <div style="font-size:0.9rem;">
-                                    Category: {p.get('category', 'N/A')}
-                                </div>
-
-                                <div style="font-size:0.9rem;">
-                                    Similarity Score: {score:.2f}
-                                </div>
-                            </div>
-
-                        </div>
-                        """,
-                        height=110
-                    )
+                    cards.append(card(
+                        image=get_product_image(p),
+                        title=p["display_name"],
+                        lines=[
+                            f"Category: {p.get('category', 'N/A')}",
+                            f"Similarity Score: {score:.2f}",
+                        ],
+                    ))
+
+                # ---------------- CARDS (one component) ----------------
+                render_grid(cards, variant="row", columns=1)
 
         except Exception as e:
             st.error(f"Recommendation failed: {e}")
@@ -2,13 +2,13 @@ import sys, os
 sys.path.append(os.getcwd())
 
 import streamlit as st
-import pandas as pd
-import streamlit.components.v1 as components
-from pathlib import Path
-import base64
+from itertools import islice
 
-from streamlit_app.common.api_client import list_products
+from streamlit_app.common.api_client import iter_products
+from streamlit_app.common.data_cache import cached_gather, search_request
 from streamlit_app.common.theme import apply_theme
+from streamlit_app.common.assets import CARD, crop_image_url
+from streamlit_app.common.grid import card, render_grid
 
 # =====================================================
 # PAGE CONFIG (MUST BE FIRST)
@@ -26,27 +26,24 @@ apply_theme("streamlit_app/assets/background/products.avif")
 # =====================================================
 # CONSTANTS
 # =====================================================
-CROPS_DIR = Path("streamlit_app/assets/crops")
 DEFAULT_IMAGE = "https://via.placeholder.com/600x400?text=No+Image"
+PAGE_SIZE = 50
+# The grid scrolls inside this many pixels instead of growing with every page
+GRID_MAX_HEIGHT = 1400
+# Only what the grid renders (plus price) is fetched from the backend
+GRID_FIELDS = "sku,display_name,category,mrp"
 
 # =====================================================
 # IMAGE RESOLUTION (LOCAL FIRST)
 # =====================================================
 def resolve_product_image(row: dict):
     """
-    Resolve product image using local assets/crops folder.
+    Resolve product image using local assets/crops folder
+    (card-sized thumbnail, written once and served by URL).
     Falls back safely if image missing.
     """
-    category = (row.get("category") or row.get("crop") or "").lower().strip()
-
-    if category:
-        img_path = CROPS_DIR / f"{category}.jpg"
-        if img_path.exists():
-            with open(img_path, "rb") as f:
-                b64 = base64.b64encode(f.read()).decode()
-            return f"data:image/jpeg;base64,{b64}"
-
-    return DEFAULT_IMAGE
+    category = row.get("category") or row.get("crop") or ""
+    return crop_image_url(category, CARD) or DEFAULT_IMAGE
 
 # =====================================================
 # PRODUCT NAME RESOLUTION
@@ -70,116 +67,96 @@ def get_ui_name(row: dict):
 st.markdown("## 📦 Farm Products")
 st.caption("Explore available agricultural products")
 
-# =====================================================
-# LOAD DATA
-# =====================================================
-products = list_products()
-df = pd.DataFrame(products)
-
-if df.empty:
-    st.info("No products available.")
-    st.stop()
-
 # =====================================================
 # FILTERS
 # =====================================================
+# Search and category filtering run on the backend over the whole catalog
 c1, c2 = st.columns(2)
 
 with c1:
-    search = st.text_input("🔍 Search by name or category")
-    if search:
-        df = df[
-            df["display_name"].str.contains(search, case=False, na=False)
-            | df["category"].str.contains(search, case=False, na=False)
-        ]
+    search = st.text_input("🔍 Search by name or category").strip()
+
+# The category box keeps its value in session state, so the category counts
+# for the search text and every loaded page of results are fetched together
+# (one cached backend page per "load more"; reset when the filters change)
+selected_category = st.session_state.get("category_filter", "All")
+filtered = bool(search) or selected_category != "All"
+if filtered and st.session_state.get("search_filters") != (search, selected_category):
+    st.session_state.search_filters = (search, selected_category)
+    st.session_state.search_pages = 1
+
+category = None if selected_category == "All" else selected_category
+pages = st.session_state.search_pages if filtered else 0
+facet_result, *results = cached_gather(
+    search_request(search, limit=0),
+    *(search_request(search, category, PAGE_SIZE, page * PAGE_SIZE, GRID_FIELDS) for page in range(pages)),
+)
+facet_counts = {f["value"]: f["count"] for f in facet_result["facets"]["category"]}
 
 with c2:
-    categories = ["All"] + sorted(df["category"].dropna().unique().tolist())
-    selected_category = st.selectbox("Filter by category", categories)
-    if selected_category != "All":
-        df = df[df["category"] == selected_category]
+    categories = ["All"] + list(facet_counts)
+    if selected_category not in categories:
+        # no longer among the facets for this search text
+        st.session_state.category_filter = "All"
+        st.rerun()
+    st.selectbox(
+        "Filter by category",
+        categories,
+        format_func=lambda c: c if c == "All" else f"{c} ({facet_counts[c]})",
+        key="category_filter"
+    )
 
 st.markdown("---")
 
+# =====================================================
+# LOAD DATA
+# =====================================================
+if filtered:
+    def load_more_products():
+        st.session_state.search_pages += 1
+
+    products = [item for result in results for item in result["items"]]
+    products_exhausted = len(products) >= results[-1]["total"]
+else:
+    # Pages are pulled lazily from a keyset-paginated iterator kept per session
+    def load_more_products():
+        batch = list(islice(st.session_state.product_iter, PAGE_SIZE))
+        st.session_state.products.extend(batch)
+        st.session_state.products_exhausted = len(batch) < PAGE_SIZE
+
+    if "product_iter" not in st.session_state:
+        st.session_state.product_iter = iter_products(PAGE_SIZE, fields=GRID_FIELDS)
+        st.session_state.products = []
+        load_more_products()
+
+    products = st.session_state.products
+    products_exhausted = st.session_state.products_exhausted
+
+if not products:
+    st.info("No products available.")
+    st.stop()
+
 # =====================================================
 # DISPLAY GRID
 # =====================================================
-cols = st.columns(3)
-
-for i, row in df.iterrows():
-
-    img_src = resolve_product_image(row)
-    name = get_ui_name(row)
-    sku = row.get("sku", "")
-    crop = row.get("category") or row.get("crop") or ""
-
-    with cols[i % 3]:
-        components.html(
-            f"""
-            <div style="
-                background:#0B3F43;
-                padding:16px;
-                border-radius:16px;
-                box-shadow:0 8px 22px rgba(11,63,67,0.55);
-                margin-bottom:20px;
-                color:#ffffff;
-                transition:
-                    transform 0.25s ease,
-                    box-shadow 0.25s ease,
-                    filter 0.25s ease;
-            "
-            onmouseover="
-                this.style.transform='scale(1.03)';
-                this.style.boxShadow='0 14px 36px rgba(11,63,67,0.75)';
-                this.style.filter='brightness(1.05)';
-            "
-            onmouseout="
-                this.style.transform='scale(1)';
-                this.style.boxShadow='0 8px 22px rgba(11,63,67,0.55)';
-                this.style.filter='brightness(1)';
-            "
-            >
-
-                <img src="{img_src}"
-                     style="
-                        width:100%;
-                        height:180px;
-                        object-fit:cover;
-                        border-radius:12px;
-                        margin-bottom:12px;
-                        background:#083344;
-                     "
-                />
-
-                <div style="
-                    font-size:1.05rem;
-                    font-weight:600;
-                    color:#D1FAE5;
-                    margin-bottom:4px;
-                ">
-                    {name}
-                </div>
-
-                <div style="
-                    font-size:0.75rem;
-                    color:#B2DFDB;
-                    margin-bottom:10px;
-                ">
-                    Code: {sku}
-                </div>
-
-                <span style="
-                    display:inline-block;
-                    background:#134E4A;
-                    color:#ECFEFF;
-                    padding:4px 12px;
-                    border-radius:999px;
-                    font-size:0.75rem;
-                ">
-                    {crop.title()}
-                </span>
-
-            </div>
-            """,
-            height=340,
-        )
+cards = [
+    card(
+        image=resolve_product_image(row),
+        title=get_ui_name(row),
+        lines=[f"Code: {row.get('sku', '')}"],
+        badge=(row.get("category") or row.get("crop") or "").title(),
+    )
+    for row in products
+]
+# the whole page of cards in one component
+render_grid(cards, variant="tile", columns=3, max_height=GRID_MAX_HEIGHT)
+
+# =====================================================
+# PAGINATION
+# =====================================================
+if not products_exhausted:
+    st.button(
+        "⬇️ Load more products",
+        on_click=load_more_products,
+        use_container_width=True
+    )
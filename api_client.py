@@ -1,21 +1,83 @@
 import os
+import asyncio
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
 
 load_dotenv()
 
 BASE_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:8000")
 
+# (connect, read) seconds; the read timeout covers a cold model load on the backend
+TIMEOUT = (
+    float(os.getenv("BACKEND_CONNECT_TIMEOUT", "3.05")),
+    float(os.getenv("BACKEND_READ_TIMEOUT", "30")),
+)
+POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "20"))
+RETRIES = int(os.getenv("BACKEND_RETRIES", "3"))
+BACKOFF = float(os.getenv("BACKEND_BACKOFF", "0.3"))
+# transient gateway / overload answers; every backend call is safe to repeat
+RETRY_STATUSES = (429, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """
+    Process-wide keep-alive session shared by every Streamlit session and
+    rerun, so calls reuse pooled connections instead of opening a new TCP
+    connection each time. Connection errors and RETRY_STATUSES are retried
+    with exponential backoff (honouring Retry-After).
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(
+                    total=RETRIES,
+                    backoff_factor=BACKOFF,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=None,
+                    raise_on_status=False,
+                )
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _get(path, params=None):
+    return get_session().get(f"{BASE_URL}{path}", params=params, timeout=TIMEOUT)
+
+
+def _post(path, payload):
+    return get_session().post(f"{BASE_URL}{path}", json=payload, timeout=TIMEOUT)
+
+
+def conditional_get(path, params=None, etag=None):
+    """
+    GET with If-None-Match. Returns (json, etag); json is None when the
+    backend answered 304 Not Modified, i.e. the caller's copy is current.
+    """
+    headers = {"If-None-Match": etag} if etag else None
+    r = get_session().get(f"{BASE_URL}{path}", params=params, headers=headers, timeout=TIMEOUT)
+    if r.status_code == 304:
+        return None, etag
+    r.raise_for_status()
+    return r.json(), r.headers.get("ETag")
+
+
 def crop_predict(features: dict):
-    url = f"{BASE_URL}/crop/predict"
     payload = {"features": features}
-    r = requests.post(url, json=payload)
+    r = _post("/crop/predict", payload)
     r.raise_for_status()
     return r.json()
 
-import requests
-
-BASE_URL = "http://127.0.0.1:8000"
 
 def price_predict(mrp, month, units_sold, category, state):
     payload = {
@@ -26,7 +88,7 @@ def price_predict(mrp, month, units_sold, category, state):
         "state": state,
     }
 
-    r = requests.post(f"{BASE_URL}/price/predict", json=payload)
+    r = _post("/price/predict", payload)
 
     if r.status_code != 200:
         raise Exception(r.text)
@@ -35,29 +97,56 @@ def price_predict(mrp, month, units_sold, category, state):
 
 
 def recommend_by_sku(sku: str, k: int = 8):
-    url = f"{BASE_URL}/recommend/sku/{sku}?k={k}"
-    r = requests.get(url)
+    r = _get(f"/recommend/sku/{sku}", {"k": k})
     r.raise_for_status()
     return r.json()
 
 def recommend_for_user(user_id: int, k: int = 10):
-    url = f"{BASE_URL}/recommend/user/{user_id}?k={k}"
-    r = requests.get(url)
+    r = _get(f"/recommend/user/{user_id}", {"k": k})
     r.raise_for_status()
     return r.json()
 
-def list_products(limit=50, skip=0):
-    url = f"{BASE_URL}/products/?limit={limit}&skip={skip}"
-    r = requests.get(url)
+def _products_params(limit, fields, **extra):
+    params = {"limit": limit, **extra}
+    if fields:
+        params["fields"] = fields
+    return params
+
+def list_products(limit=50, skip=0, fields=None):
+    """`fields` (e.g. "sku,display_name") limits what the backend fetches and sends."""
+    r = _get("/products/", _products_params(limit, fields, skip=skip))
     r.raise_for_status()
     return r.json()
 
-import requests
+def list_products_page(limit=50, cursor="", fields=None):
+    """One keyset page: {"items": [...], "next_cursor": str | None}."""
+    r = _get("/products/", _products_params(limit, fields, cursor=cursor))
+    r.raise_for_status()
+    return r.json()
+
+def _search_params(q, category, limit, offset, fields):
+    params = _products_params(limit, fields, q=q, offset=offset)
+    if category:
+        params["category"] = category
+    return params
+
+def search_products(q="", category=None, limit=50, offset=0, fields=None):
+    """Server-side search: {"total", "items", "facets": {"category": [{"value", "count"}]}, ...}."""
+    r = _get("/products/search", _search_params(q, category, limit, offset, fields))
+    r.raise_for_status()
+    return r.json()
+
+def iter_products(page_size=50, fields=None):
+    """Yield products lazily, fetching the next page only when it is needed."""
+    cursor = ""
+    while cursor is not None:
+        page = list_products_page(page_size, cursor, fields)
+        yield from page["items"]
+        cursor = page["next_cursor"]
 
-BASE_URL = "http://127.0.0.1:8000"
 
 def get_price_categories():
-    r = requests.get(f"{BASE_URL}/price/categories")
+    r = _get("/price/categories")
 
     if r.status_code != 200:
         raise Exception(r.text)
@@ -65,9 +154,123 @@ def get_price_categories():
     return r.json()["categories"]
 
 def get_price_states():
-    r = requests.get(f"{BASE_URL}/price/states")
+    r = _get("/price/states")
 
     if r.status_code != 200:
         raise Exception(r.text)
 
     return r.json()["states"]
+
+
+class AsyncApiClient:
+    """
+    asyncio counterpart of the functions above (same names, same results),
+    on a pooled httpx.AsyncClient with the same timeouts and retry policy:
+
+        async with AsyncApiClient() as api:
+            products, categories = await asyncio.gather(
+                api.list_products(fields="sku,display_name"), api.get_price_categories()
+            )
+
+    From Streamlit code, use gather() below (or data_cache.cached_gather,
+    which only goes to the network for what is not cached).
+    """
+
+    def __init__(self, base_url: str | None = None):
+        import httpx  # only needed by async callers
+
+        self._httpx = httpx
+        self._client = httpx.AsyncClient(
+            base_url=base_url or BASE_URL,
+            timeout=httpx.Timeout(TIMEOUT[1], connect=TIMEOUT[0]),
+            limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _request(self, method, path, **kwargs):
+        for attempt in range(RETRIES + 1):
+            last = attempt == RETRIES
+            try:
+                r = await self._client.request(method, path, **kwargs)
+            except self._httpx.TransportError:
+                if last:
+                    raise
+            else:
+                if r.status_code not in RETRY_STATUSES or last:
+                    return r
+            await asyncio.sleep(BACKOFF * (2 ** attempt))
+
+    async def conditional_get(self, path, params=None, etag=None):
+        headers = {"If-None-Match": etag} if etag else None
+        r = await self._request("GET", path, params=params, headers=headers)
+        if r.status_code == 304:
+            return None, etag
+        r.raise_for_status()
+        return r.json(), r.headers.get("ETag")
+
+    async def _json(self, method, path, **kwargs):
+        r = await self._request(method, path, **kwargs)
+        r.raise_for_status()
+        return r.json()
+
+    async def crop_predict(self, features: dict):
+        return await self._json("POST", "/crop/predict", json={"features": features})
+
+    async def price_predict(self, mrp, month, units_sold, category, state):
+        payload = {"mrp": mrp, "month": month, "units_sold": units_sold, "category": category, "state": state}
+        r = await self._request("POST", "/price/predict", json=payload)
+        if r.status_code != 200:
+            raise Exception(r.text)
+        return r.json()
+
+    async def recommend_by_sku(self, sku: str, k: int = 8):
+        return await self._json("GET", f"/recommend/sku/{sku}", params={"k": k})
+
+    async def recommend_for_user(self, user_id: int, k: int = 10):
+        return await self._json("GET", f"/recommend/user/{user_id}", params={"k": k})
+
+    async def list_products(self, limit=50, skip=0, fields=None):
+        return await self._json("GET", "/products/", params=_products_params(limit, fields, skip=skip))
+
+    async def list_products_page(self, limit=50, cursor="", fields=None):
+        return await self._json("GET", "/products/", params=_products_params(limit, fields, cursor=cursor))
+
+    async def search_products(self, q="", category=None, limit=50, offset=0, fields=None):
+        return await self._json("GET", "/products/search", params=_search_params(q, category, limit, offset, fields))
+
+    async def get_price_categories(self):
+        r = await self._request("GET", "/price/categories")
+        if r.status_code != 200:
+            raise Exception(r.text)
+        return r.json()["categories"]
+
+    async def get_price_states(self):
+        r = await self._request("GET", "/price/states")
+        if r.status_code != 200:
+            raise Exception(r.text)
+        return r.json()["states"]
+
+
+def gather(*calls):
+    """
+    Run several AsyncApiClient calls concurrently from synchronous code and
+    return their results in order; each call is a function of the client:
+
+        categories, states = gather(
+            lambda api: api.get_price_categories(),
+            lambda api: api.get_price_states(),
+        )
+    """
+    async def run():
+        async with AsyncApiClient() as api:
+            return await asyncio.gather(*(call(api) for call in calls))
+
+    return list(asyncio.run(run()))
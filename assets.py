@@ -0,0 +1,150 @@
+import os
+import io
+import base64
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+LOGGER = logging.getLogger(__name__)
+
+CROPS_DIR = Path("streamlit_app/assets/crops")
+# Resized copies served by Streamlit (server.enableStaticServing): files in
+# STATIC_DIR are at STATIC_URL, relative to the app's own address
+STATIC_DIR = Path(os.getenv("UI_STATIC_DIR", "streamlit_app/static"))
+STATIC_URL = os.getenv("UI_STATIC_URL", "app/static")
+THUMBS = "thumbs"
+
+# Render sizes as (max width, max height) in px, about 2x the CSS box so
+# thumbnails stay sharp on HiDPI screens.
+THUMB = (112, 112)        # recommendation list icons (56px)
+CARD = (480, 360)         # product grid cards (180px high, 1/3 page wide)
+HERO = (640, 640)         # crop prediction result (320px)
+BACKGROUND = (1920, 1920)
+
+ASSET_CACHE_SIZE = int(os.getenv("UI_ASSET_CACHE_SIZE", "256"))
+QUALITY = int(os.getenv("UI_ASSET_QUALITY", "80"))
+
+_MIME = {"JPEG": "image/jpeg", "WEBP": "image/webp", "PNG": "image/png"}
+_EXT = {"JPEG": "jpg", "WEBP": "webp", "PNG": "png"}
+_SUFFIX_MIME = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png",
+                ".webp": "image/webp", ".avif": "image/avif"}
+
+# (path, size, format, mtime) -> (mime, base64); module level, shared by all sessions
+_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+# same key -> URL of the copy written under STATIC_DIR
+_urls: "OrderedDict[tuple, str]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _encode(path: Path, size, fmt: str):
+    """Downscale and re-encode an image; the original bytes if Pillow cannot decode it."""
+    try:
+        from PIL import Image  # installed with streamlit
+
+        with Image.open(path) as img:
+            img.thumbnail(size)  # keeps the aspect ratio, never upscales
+            if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+                img = img.convert("RGB")
+            buf = io.BytesIO()
+            img.save(buf, fmt, quality=QUALITY)
+        return _MIME[fmt], buf.getvalue()
+    except Exception:
+        with open(path, "rb") as f:
+            return _SUFFIX_MIME.get(path.suffix.lower(), "application/octet-stream"), f.read()
+
+
+def image_b64(path, size, fmt: str = "JPEG"):
+    """
+    (mime, base64) of `path` resized to fit `size`, or None if the file is
+    missing. Each (file, size, format) is read and encoded once; the key
+    includes the file's mtime, so replacing an asset on disk is picked up
+    on the next call.
+    """
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    key = (str(path), size, fmt, mtime)
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None:
+            _cache.move_to_end(key)
+            return hit
+
+    mime, data = _encode(path, size, fmt)
+    value = (mime, base64.b64encode(data).decode())
+    with _lock:
+        _cache[key] = value
+        while len(_cache) > ASSET_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return value
+
+
+def image_data_uri(path, size, fmt: str = "JPEG"):
+    """`data:` URI for an <img src>, or None if the file is missing."""
+    found = image_b64(path, size, fmt)
+    if found is None:
+        return None
+    mime, b64 = found
+    return f"data:{mime};base64,{b64}"
+
+
+def image_url(path, size, fmt: str = "JPEG"):
+    """
+    URL of `path` resized to fit `size`, or None if the file is missing.
+
+    The resized copy is written to STATIC_DIR once per (file, size, format,
+    mtime) and served by Streamlit, so a page only references it and the
+    browser fetches it when an <img loading="lazy"> comes into view (and
+    caches it). Falls back to a data URI if STATIC_DIR is not writable.
+    """
+    path = Path(path)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except OSError:
+        return None
+    key = (str(path), size, fmt, mtime)
+    with _lock:
+        hit = _urls.get(key)
+        if hit is not None:
+            _urls.move_to_end(key)
+            return hit
+
+    digest = hashlib.sha1(repr(key).encode()).hexdigest()[:12]
+    name = f"{path.stem}-{size[0]}x{size[1]}-{digest}.{_EXT[fmt]}"
+    target = STATIC_DIR / THUMBS / name
+    if not target.exists():
+        _, data = _encode(path, size, fmt)
+        tmp = target.with_name(f".{name}.{os.getpid()}.{threading.get_ident()}")
+        try:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_bytes(data)
+            os.replace(tmp, target)  # never serve a half-written file
+        except OSError:
+            LOGGER.warning("cannot write %s; inlining the image instead", target, exc_info=True)
+            return image_data_uri(path, size, fmt)
+    url = f"{STATIC_URL}/{THUMBS}/{name}"
+    with _lock:
+        _urls[key] = url
+        while len(_urls) > ASSET_CACHE_SIZE:
+            _urls.popitem(last=False)
+    return url
+
+
+def crop_image_uri(category: str, size=CARD, crops_dir: Path = CROPS_DIR):
+    """Data URI of the crop photo for a product category (banana.jpg, ...), or None."""
+    category = (category or "").lower().strip()
+    if not category:
+        return None
+    return image_data_uri(crops_dir / f"{category}.jpg", size)
+
+
+def crop_image_url(category: str, size=CARD, crops_dir: Path = CROPS_DIR):
+    """Static URL of the crop photo for a product category (see image_url), or None."""
+    category = (category or "").lower().strip()
+    if not category:
+        return None
+    return image_url(crops_dir / f"{category}.jpg", size)
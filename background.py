@@ -1,8 +1,8 @@
-import base64
-from pathlib import Path
+from streamlit_app.common.assets import BACKGROUND, image_b64
 
 def get_base64_bg(path: str):
-    bg_file = Path(path)
-    with open(bg_file, "rb") as f:
-        data = f.read()
-    return base64.b64encode(data).decode()
+    # encoded once per file (theme.apply_theme runs on every page run)
+    found = image_b64(path, BACKGROUND, "WEBP")
+    if found is None:
+        raise FileNotFoundError(path)
+    return found[1]
@@ -0,0 +1,394 @@
+# bench.py
+"""
+Reproducible load tests for the FastAPI endpoints.
+
+    python -m app.bench --skus 10000 --concurrency 16 --requests 2000 --out bench.json
+    python -m app.bench --skus 10000 --baseline bench.json   # compare with an earlier run
+
+Starts `python -m app.bench serve` in a subprocess: main.py's app on the
+in-memory Mongo stand-in (MONGO_URI=mongomock://), seeded from a fixed
+random seed with synthetic products, transactions and item_neighbors at
+the requested scale (1k to 1M SKUs). Each scenario hits one endpoint with
+`--requests` requests from `--concurrency` concurrent clients, after
+`--warmup` unrecorded ones, cycling through `--distinct` pre-generated
+requests so the prediction caches see a realistic mix of hits and misses.
+
+The report is one JSON document: throughput, latency percentiles, errors
+and the server's RSS after every scenario, plus the seed parameters and
+the git revision, so runs before and after a change can be diffed.
+Throughput and percentiles count 2xx responses only; everything else
+(including 503s from a saturated inference executor) is an error with its
+own latency summary, and --baseline does not compare scenarios in which
+either run had errors.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+STANDIN_URI = "mongomock://"
+SEED = 42
+INSERT_CHUNK = 10000
+CATEGORIES = ("rice", "maize", "banana", "apple", "mango", "grapes", "coffee", "cotton",
+              "jute", "lentil", "chickpea", "coconut", "papaya", "orange", "watermelon")
+SCENARIOS = ("crop_predict", "price_predict", "recommend_sku", "recommend_user",
+             "products", "models_download")
+# feature ranges of the crop recommendation dataset
+CROP_RANGES = {"N": (0, 140), "P": (5, 145), "K": (5, 205), "temperature": (8.0, 44.0),
+               "humidity": (14.0, 100.0), "ph": (3.5, 9.9), "rainfall": (20.0, 299.0)}
+
+
+# --------------------------------------------------------------------------- seeding
+
+def seed(db, skus: int, users: int, tx_per_user: int, neighbors: int, rng_seed: int = SEED) -> dict:
+    """
+    Fill products, transactions and item_neighbors with synthetic data.
+    Purchases are skewed towards low SKU numbers, so some items and users
+    are much heavier than others.
+    """
+    rng = np.random.default_rng(rng_seed)
+    started = time.perf_counter()
+
+    for lo in range(0, skus, INSERT_CHUNK):
+        n = min(INSERT_CHUNK, skus - lo)
+        cats = rng.integers(0, len(CATEGORIES), n)
+        mrp = np.round(rng.uniform(10, 4000, n), 2)
+        sold = rng.zipf(1.5, n) % 5000
+        db.products.insert_many([
+            {"_id": _sku(lo + i), "name": f"{CATEGORIES[c].title()} {lo + i}", "category": CATEGORIES[c],
+             "mrp": float(p), "units_sold": int(u)}
+            for i, (c, p, u) in enumerate(zip(cats.tolist(), mrp.tolist(), sold.tolist()))
+        ])
+
+    n_tx = users * tx_per_user
+    for lo in range(0, n_tx, INSERT_CHUNK):
+        n = min(INSERT_CHUNK, n_tx - lo)
+        user = rng.integers(1, users + 1, n)
+        item = (skus * rng.random(n) ** 3).astype(np.int64)
+        qty = rng.integers(1, 6, n)
+        db.transactions.insert_many([
+            {"user_id": int(u), "sku": _sku(i), "quantity": int(q), "day": 1}
+            for u, i, q in zip(user.tolist(), item.tolist(), qty.tolist())
+        ])
+
+    computed_at = datetime.utcnow()
+    for lo in range(0, skus, INSERT_CHUNK):
+        n = min(INSERT_CHUNK, skus - lo)
+        nb = rng.integers(0, skus, (n, neighbors))
+        scores = -np.sort(-rng.random((n, neighbors)), axis=1)
+        db.item_neighbors.insert_many([
+            {"_id": _sku(lo + i),
+             "neighbors": [{"sku": _sku(j), "score": float(s)} for j, s in zip(row.tolist(), sc.tolist())],
+             "computed_at": computed_at}
+            for i, (row, sc) in enumerate(zip(nb, scores))
+        ])
+
+    return {"skus": skus, "users": users, "transactions": n_tx, "neighbors": neighbors,
+            "seed": rng_seed, "seconds": round(time.perf_counter() - started, 3)}
+
+
+def _sku(i: int) -> str:
+    return f"SKU{i:07d}"
+
+
+def serve(args):
+    """Seed the stand-in and serve main.py's app in this process (the benchmark target)."""
+    os.environ["MONGO_URI"] = STANDIN_URI
+    import uvicorn
+    from .db import db
+
+    info = seed(db, args.skus, args.users or _default_users(args.skus), args.tx_per_user, args.neighbors, args.seed)
+    LOGGER.info("seeded %s", info)
+    from .main import app
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def _default_users(skus: int) -> int:
+    return max(100, skus // 10)
+
+
+# --------------------------------------------------------------------------- scenarios
+
+def build_requests(name: str, rng: random.Random, n: int, ctx: dict) -> List[tuple]:
+    """`n` (method, url, json body) tuples for one scenario."""
+    skus, users = ctx["skus"], ctx["users"]
+    if name == "crop_predict":
+        return [("POST", "/crop/predict",
+                 {"features": {f: round(rng.uniform(lo, hi), 1) for f, (lo, hi) in CROP_RANGES.items()}})
+                for _ in range(n)]
+    if name == "price_predict":
+        return [("POST", "/price/predict",
+                 {"mrp": round(rng.uniform(10, 4000), 2), "month": rng.randint(1, 12),
+                  "units_sold": rng.randint(0, 2500), "category": rng.choice(ctx["categories"]),
+                  "state": rng.choice(ctx["states"])})
+                for _ in range(n)]
+    if name == "recommend_sku":
+        return [("GET", f"/recommend/sku/{_sku(rng.randrange(skus))}?k=10", None) for _ in range(n)]
+    if name == "recommend_user":
+        return [("GET", f"/recommend/user/{rng.randint(1, users)}?k=10", None) for _ in range(n)]
+    if name == "products":
+        return [("GET", f"/products/?limit=50&skip={50 * rng.randrange(20)}", None) for _ in range(n)]
+    if name == "models_download":
+        return [("GET", f"/models/download/{ctx['file_id']}", None)]
+    raise ValueError(f"unknown scenario {name!r}")
+
+
+async def _phase(client, requests: List[tuple], total: int, concurrency: int, samples: Optional[list]):
+    """
+    Send `total` requests from `concurrency` workers, appending (status,
+    seconds) to `samples`; status is the HTTP status code or the exception
+    name, as a string. Returns {status: count}.
+    """
+    counter = itertools.count()
+    statuses: Dict[str, int] = {}
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            method, url, body = requests[i % len(requests)]
+            start = time.perf_counter()
+            try:
+                status = str((await client.request(method, url, json=body)).status_code)
+            except Exception as e:
+                status = type(e).__name__
+            if samples is not None:
+                samples.append((status, time.perf_counter() - start))
+            statuses[status] = statuses.get(status, 0) + 1
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return statuses
+
+
+def _is_success(status: str) -> bool:
+    return status.isdigit() and 200 <= int(status) < 300
+
+
+def _latency_summary(seconds: List[float]) -> Optional[dict]:
+    if not seconds:
+        return None
+    ms = np.asarray(seconds) * 1000
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99]).tolist()
+    return {"mean": round(float(ms.mean()), 3), "p50": round(p50, 3), "p95": round(p95, 3),
+            "p99": round(p99, 3), "max": round(float(ms.max()), 3)}
+
+
+async def run_scenario(client, name: str, requests: List[tuple], args, pid: int) -> dict:
+    await _phase(client, requests, args.warmup, args.concurrency, None)
+    samples: List[tuple] = []
+    start = time.perf_counter()
+    statuses = await _phase(client, requests, args.requests, args.concurrency, samples)
+    elapsed = time.perf_counter() - start
+    ok = [t for status, t in samples if _is_success(status)]
+    failed = [t for status, t in samples if not _is_success(status)]
+    return {
+        "scenario": name,
+        "requests": len(samples),
+        # statuses tells 503s (the inference executor shedding load) apart from failures
+        "errors": len(failed),
+        "error_rate": round(len(failed) / len(samples), 4) if samples else 0.0,
+        "statuses": dict(sorted(statuses.items())),
+        "seconds": round(elapsed, 3),
+        # a fast error is not served work: both cover 2xx responses only
+        "throughput_rps": round(len(ok) / elapsed, 1),
+        "latency_ms": _latency_summary(ok),
+        "error_latency_ms": _latency_summary(failed),
+        **_rss(pid),
+    }
+
+
+def _rss(pid: int) -> dict:
+    """Current and peak resident set size of `pid` in MiB (Linux /proc; empty elsewhere)."""
+    out = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    out["rss_mb" if key == "VmRSS" else "peak_rss_mb"] = round(int(value.split()[0]) / 1024, 1)
+    except OSError:
+        pass
+    return out
+
+
+# --------------------------------------------------------------------------- driver
+
+async def drive(args, base_url: str, pid: int) -> List[dict]:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        ctx = {"skus": args.skus, "users": args.users or _default_users(args.skus)}
+        ctx["categories"] = (await client.get("/price/categories")).json()["categories"]
+        ctx["states"] = (await client.get("/price/states")).json()["states"]
+        blob = os.urandom(args.model_bytes)
+        r = await client.post("/models/upload", files={"file": ("bench.bin", blob, "application/octet-stream")})
+        r.raise_for_status()
+        ctx["file_id"] = r.json()["file_id"]
+
+        rng = random.Random(args.seed)
+        results = []
+        for name in args.scenarios:
+            requests = build_requests(name, rng, args.distinct, ctx)
+            result = await run_scenario(client, name, requests, args, pid)
+            LOGGER.info("%s: %s rps, p99 %s ms, %d errors", name, result["throughput_rps"],
+                        (result["latency_ms"] or {}).get("p99"), result["errors"])
+            results.append(result)
+        return results
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_ready(proc, base_url: str, timeout: float):
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"benchmark server exited with {proc.returncode}")
+        try:
+            if httpx.get(f"{base_url}/metrics", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"benchmark server not ready after {timeout}s")
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: List[dict], baseline: dict):
+    """
+    Attach throughput and p99 ratios (this run / baseline) to each scenario.
+    A scenario with errors in either run gets {"refused": reason} instead:
+    its numbers describe a different workload (e.g. load shedding) and a
+    ratio would look like a speedup.
+    """
+    before: Dict[str, dict] = {r["scenario"]: r for r in baseline.get("results", [])}
+    for r in results:
+        b = before.get(r["scenario"])
+        if not b:
+            continue
+        bad = [f"{label} run had {x['errors']} errors of {x['requests']}"
+               for label, x in (("this", r), ("baseline", b)) if x.get("errors")]
+        if bad:
+            r["vs_baseline"] = {"refused": "; ".join(bad)}
+            continue
+        r["vs_baseline"] = {
+            "throughput": round(r["throughput_rps"] / b["throughput_rps"], 3),
+            "p99": round(r["latency_ms"]["p99"] / b["latency_ms"]["p99"], 3),
+        }
+
+
+def run(args) -> dict:
+    port = args.port or _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, "-m", __spec__.name, "serve", "--port", str(port), "--skus", str(args.skus),
+           "--users", str(args.users), "--tx-per-user", str(args.tx_per_user),
+           "--neighbors", str(args.neighbors), "--seed", str(args.seed)]
+    proc = subprocess.Popen(cmd, env={**os.environ, "MONGO_URI": STANDIN_URI})
+    try:
+        started = time.perf_counter()
+        _wait_ready(proc, base_url, args.startup_timeout)
+        startup = {"seconds": round(time.perf_counter() - started, 3), **_rss(proc.pid)}
+        results = asyncio.run(drive(args, base_url, proc.pid))
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+    report = {
+        "meta": {
+            "git": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "started_at": datetime.utcnow().isoformat(),
+            "skus": args.skus,
+            "users": args.users or _default_users(args.skus),
+            "tx_per_user": args.tx_per_user,
+            "neighbors": args.neighbors,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "distinct": args.distinct,
+        },
+        "startup": startup,
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", nargs="?", default="run", choices=("run", "serve"))
+    parser.add_argument("--skus", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=0, help="default: skus / 10 (at least 100)")
+    parser.add_argument("--tx-per-user", type=int, default=10)
+    parser.add_argument("--neighbors", type=int, default=20, help="neighbors stored per SKU")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=2000, help="recorded requests per scenario")
+    parser.add_argument("--warmup", type=int, default=200)
+    parser.add_argument("--distinct", type=int, default=500, help="distinct requests per scenario")
+    parser.add_argument("--model-bytes", type=int, default=4 * 1024 * 1024, help="size of the downloaded blob")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--startup-timeout", type=float, default=1800.0)
+    parser.add_argument("--scenarios", type=lambda s: s.split(","), default=list(SCENARIOS),
+                        help="comma-separated subset of " + ",".join(SCENARIOS))
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--out", help="write the report here instead of stdout")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+
+    if args.command == "serve":
+        serve(args)
+        return
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {sorted(unknown)}")
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
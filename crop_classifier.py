@@ -1,14 +1,236 @@
 # crop_classifier.py
-import joblib
-
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import os, pandas as pd
+import os, copy, itertools, numpy as np, pandas as pd
 from typing import Dict, Any, List
-from ..models_loader import load_model
+from ..model_registry import registry
+from ..prediction_cache import create_cache, quantize, MISS
+from ..metrics import span
+from ..inference import executor
 
 router = APIRouter(prefix="/crop", tags=["crop"])
 
+MODEL_NAME = "crop_pipeline"
+LABEL_ENCODER_NAME = "crop_label_encoder"
+
+# Map frontend feature names → training feature names
+FEATURE_MAP = {
+    "nitrogen": "N",
+    "phosphorus": "P",
+    "potassium": "K"
+}
+REQUIRED_FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+
+BATCH_MAX_ROWS = int(os.getenv("CROP_BATCH_MAX_ROWS", "10000"))
+# Above this many rows sklearn's per-tree predict_proba beats the NumPy walk
+FOREST_MAX_ROWS = int(os.getenv("CROP_FOREST_MAX_ROWS", "256"))
+
+# Typical slider defaults from the Streamlit page, used to validate new versions
+SMOKE_FEATURES = {
+    "N": 90, "P": 40, "K": 40,
+    "temperature": 25.0, "humidity": 80.0, "ph": 6.5, "rainfall": 120.0,
+}
+
+def _smoke_crop(pipeline):
+    proba = pipeline.predict_proba(pd.DataFrame([SMOKE_FEATURES]))
+    if proba.shape != (1, len(pipeline.classes_)):
+        raise ValueError(f"unexpected predict_proba shape {proba.shape}")
+
+def _smoke_label_encoder(label_encoder):
+    label_encoder.inverse_transform([0])
+
+# Values per feature for the equivalence grid (covers the Streamlit slider ranges)
+EQUIVALENCE_GRID = {
+    "N": [0, 45, 90, 150],
+    "P": [5, 40, 145],
+    "K": [5, 40, 205],
+    "temperature": [8.5, 25.0, 43.7],
+    "humidity": [14.0, 80.0, 99.9],
+    "ph": [3.5, 6.5, 9.9],
+    "rainfall": [20.0, 120.0, 299.0],
+}
+
+class CompiledForest:
+    """
+    A fitted random forest / extra-trees classifier flattened into NumPy arrays.
+
+    All trees are concatenated into one node table (leaves point at
+    themselves), so a batch walks every tree at once in `max_depth` vectorised
+    steps instead of one Cython call per tree. Leaf probabilities are
+    normalised and averaged in the same order as sklearn's predict_proba.
+    """
+
+    def __init__(self, forest):
+        trees = [est.tree_ for est in forest.estimators_]
+        n_classes = int(forest.n_classes_)
+        offsets = np.cumsum([0] + [t.node_count for t in trees[:-1]])
+
+        left, right, feature, threshold, value = [], [], [], [], []
+        for off, t in zip(offsets, trees):
+            nodes = np.arange(t.node_count)
+            leaf = t.children_left == -1
+            left.append(np.where(leaf, nodes, t.children_left) + off)
+            right.append(np.where(leaf, nodes, t.children_right) + off)
+            feature.append(np.where(leaf, 0, t.feature))
+            threshold.append(np.where(leaf, np.inf, t.threshold))
+            # DecisionTreeClassifier.predict_proba normalisation
+            v = t.value[:, 0, :n_classes]
+            normalizer = v.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            value.append(v / normalizer)
+
+        self.roots = offsets.astype(np.intp)
+        self.left = np.concatenate(left).astype(np.intp)
+        self.right = np.concatenate(right).astype(np.intp)
+        self.feature = np.concatenate(feature).astype(np.intp)
+        self.threshold = np.concatenate(threshold).astype(np.float64)
+        self.value = np.concatenate(value)
+        self.depth = max(t.max_depth for t in trees)
+
+    CHUNK_ROWS = 1024  # bounds the (rows, trees, classes) leaf tensor
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        # sklearn trees see float32 inputs and compare them against float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.shape[0] > self.CHUNK_ROWS:
+            return np.concatenate([
+                self._predict_chunk(X[i:i + self.CHUNK_ROWS])
+                for i in range(0, X.shape[0], self.CHUNK_ROWS)
+            ])
+        return self._predict_chunk(X)
+
+    def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots)))
+        for _ in range(self.depth):
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(go_left, self.left[node], self.right[node])
+        leaf_proba = self.value[node]  # (n_samples, n_trees, n_classes)
+        out = np.zeros((X.shape[0], self.value.shape[1]))
+        for t in range(leaf_proba.shape[1]):
+            out += leaf_proba[:, t]
+        out /= leaf_proba.shape[1]
+        return out
+
+
+class CompiledCropModel:
+    """
+    ndarray-only inference for the crop pipeline, built once per version.
+
+    The fitted scaler parameters are read out of the sklearn Pipeline and
+    applied to a fixed-order float64 row over REQUIRED_FEATURES; the final
+    estimator then runs one predict_proba, and the label is its argmax.
+    Single rows and batches of up to FOREST_MAX_ROWS use the flattened
+    CompiledForest when the estimator is a forest; larger batches call the
+    estimator itself.
+    The constructor compares predict and predict_proba of both paths with
+    the original pipeline on EQUIVALENCE_GRID and raises on any difference,
+    in which case the registry keeps serving the pipeline as-is.
+    """
+
+    def __init__(self, pipeline):
+        steps = getattr(pipeline, "steps", None)
+        if not steps:
+            raise ValueError("crop model is not an sklearn Pipeline")
+
+        self.order = list(getattr(pipeline, "feature_names_in_", REQUIRED_FEATURES))
+        if sorted(self.order) != sorted(REQUIRED_FEATURES):
+            raise ValueError(f"pipeline was fit on {self.order}")
+
+        self.transforms = [self._extract(step) for _, step in steps[:-1]]
+        self.estimator = steps[-1][1]
+        if not hasattr(self.estimator, "predict_proba"):
+            raise ValueError("final estimator has no predict_proba")
+        if getattr(self.estimator, "n_jobs", None) not in (None, 1):
+            # spinning up a joblib pool per request costs more than the trees;
+            # a shallow copy shares the fitted arrays with the original
+            self.estimator = copy.copy(self.estimator)
+            self.estimator.n_jobs = 1
+        self.forest = None
+        if type(self.estimator).__name__ in ("RandomForestClassifier", "ExtraTreesClassifier"):
+            self.forest = CompiledForest(self.estimator)
+        self.classes = pipeline.classes_
+
+        self._check_equivalence(pipeline)
+
+    @staticmethod
+    def _extract(step):
+        name = type(step).__name__
+        if name == "StandardScaler":
+            mean = step.mean_ if step.with_mean else None
+            scale = step.scale_ if step.with_std else None
+            def standard(X):
+                if mean is not None:
+                    X -= mean
+                if scale is not None:
+                    X /= scale
+                return X
+            return standard
+        if name == "MinMaxScaler" and not step.clip:
+            scale, offset = step.scale_, step.min_
+            def minmax(X):
+                X *= scale
+                X += offset
+                return X
+            return minmax
+        if name == "SimpleImputer" and not step.add_indicator:
+            stats = step.statistics_
+            def impute(X):
+                return np.where(np.isnan(X), stats, X)
+            return impute
+        raise ValueError(f"unsupported pipeline step {name}")
+
+    def matrix(self, rows: List[Dict[str, Any]]) -> np.ndarray:
+        """Mapped feature dicts -> (n, 7) float64 matrix in training order."""
+        return np.array([[float(r[f]) for f in self.order] for r in rows], dtype=np.float64)
+
+    def transform(self, X: np.ndarray) -> np.ndarray:
+        X = np.array(X, dtype=np.float64)  # transforms work in place, like sklearn's copy
+        for transform in self.transforms:
+            X = transform(X)
+        return X
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        X = self.transform(X)
+        if self.forest is not None and len(X) <= FOREST_MAX_ROWS:
+            return self.forest.predict_proba(X)
+        return self.estimator.predict_proba(X)
+
+    def predict(self, X: np.ndarray):
+        """Returns (encoded labels, probabilities) from a single pass."""
+        proba = self.predict_proba(X)
+        return self.classes[proba.argmax(axis=1)], proba
+
+    def _check_equivalence(self, pipeline):
+        grid = pd.DataFrame(
+            list(itertools.product(*EQUIVALENCE_GRID.values())),
+            columns=list(EQUIVALENCE_GRID),
+        )[self.order]
+        expected_proba = pipeline.predict_proba(grid)
+        expected_labels = pipeline.predict(grid)
+        X = self.transform(grid.to_numpy(dtype=np.float64))
+        paths = [self.estimator] if self.forest is None else [self.estimator, self.forest]
+        for path in paths:
+            proba = path.predict_proba(X)
+            if not np.array_equal(proba, expected_proba):
+                raise ValueError("compiled predict_proba differs from the pipeline")
+            if not np.array_equal(self.classes[proba.argmax(axis=1)], expected_labels):
+                raise ValueError("compiled predict differs from the pipeline")
+
+registry.register(
+    MODEL_NAME,
+    os.getenv("CROP_PIPELINE_PATH", "app/models/crop_pipeline.pkl"),
+    smoke=_smoke_crop,
+    compiler=CompiledCropModel,
+)
+registry.register(
+    LABEL_ENCODER_NAME,
+    os.getenv("CROP_LABEL_ENCODER_PATH", "app/models/label_encoder.pkl"),
+    smoke=_smoke_label_encoder,
+)
+
+cache = create_cache("crop", [MODEL_NAME, LABEL_ENCODER_NAME])
+
 # Accept any features as a dict (will be converted to DataFrame)
 class CropRequest(BaseModel):
     features: Dict[str, Any]
@@ -16,59 +238,110 @@ class CropRequest(BaseModel):
 class CropResponse(BaseModel):
     predicted_label: str
     predicted_proba: List[float] | None = None
+
+# Many feature dicts at once, e.g. a region's soil survey
+class CropBatchRequest(BaseModel):
+    rows: List[Dict[str, Any]]
+
+class CropBatchItem(BaseModel):
+    index: int
+    predicted_label: str | None = None
+    predicted_proba: List[float] | None = None
+    error: str | None = None
+
+class CropBatchResponse(BaseModel):
+    results: List[CropBatchItem]
 import traceback
 
 @router.post("/predict", response_model=CropResponse)
-def crop_predict(req: CropRequest):
-    MODEL_NAME = "crop_pipeline"
-    MODEL_PATH = os.getenv("CROP_PIPELINE_PATH", "app/models/crop_pipeline.pkl")
-
-    pipeline = load_model(MODEL_NAME, MODEL_PATH)
-    LABEL_ENCODER_PATH = os.getenv(
-        "CROP_LABEL_ENCODER_PATH",
-        "app/models/label_encoder.pkl"
-    )
+async def crop_predict(req: CropRequest):
+    """Cache hits are answered here; the model runs on the inference executor."""
+    mapped_features = _map_features(req)
+    versions = (registry.version(MODEL_NAME), registry.version(LABEL_ENCODER_NAME))
+    key = None
+    if None not in versions:
+        key = _cache_key(versions, mapped_features)
+        if key is not None:
+            cached = cache.get(key)
+            if cached is not MISS:
+                return cached
+    return await executor.run(_crop_predict, mapped_features, key)
 
-    label_encoder = joblib.load(LABEL_ENCODER_PATH)
 
+def _map_features(req: CropRequest) -> Dict[str, Any]:
     #X = pd.DataFrame([req.features])
-    # Map frontend feature names → training feature names
-    feature_map = {
-        "nitrogen": "N",
-        "phosphorus": "P",
-        "potassium": "K"
-    }
-
     mapped_features = {}
 
     for key, value in req.features.items():
-        if key in feature_map:
-            mapped_features[feature_map[key]] = value
+        if key in FEATURE_MAP:
+            mapped_features[FEATURE_MAP[key]] = value
         else:
             mapped_features[key] = value
 
     # Ensure all required features exist
-    required_features = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
-
-    missing = [f for f in required_features if f not in mapped_features]
+    missing = [f for f in REQUIRED_FEATURES if f not in mapped_features]
     if missing:
         raise HTTPException(
             status_code=400,
             detail=f"Missing required features: {missing}"
         )
+    return mapped_features
+
+
+def _cache_key(versions, mapped_features: Dict[str, Any]):
+    try:
+        return tuple(versions) + tuple(quantize(mapped_features[f]) for f in REQUIRED_FEATURES)
+    except (TypeError, ValueError):
+        return None  # non-numeric input: let the model report the error
+
+
+def _crop_predict(mapped_features: Dict[str, Any], looked_up=None) -> dict:
+    """`looked_up` is the key the route already counted a miss for, if any."""
+    try:
+        entry = registry.get(MODEL_NAME)
+        encoder_entry = registry.get(LABEL_ENCODER_NAME)
+        label_encoder = encoder_entry.model
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"model load error: {e}")
+
+    key = _cache_key((entry.version, encoder_entry.version), mapped_features)
+    if key is not None:
+        # another request may have filled it while this one queued
+        cached = cache.peek(key) if key == looked_up else cache.get(key)
+        if cached is not MISS:
+            return cached
 
-    X = pd.DataFrame([mapped_features])
+    result = _predict_one(entry, label_encoder, mapped_features)
+    if key is not None:
+        cache.put(key, result)
+    return result
 
+
+def _predict_one(entry, label_encoder, mapped_features: Dict[str, Any]) -> dict:
+    pipeline = entry.model
     try:
-        print("INPUT COLUMNS:", X.columns.tolist())
-        pred_encoded = pipeline.predict(X)[0]
+        if entry.compiled is not None:
+            compiled = entry.compiled
+            with span("feature_engineering"):
+                X = compiled.matrix([mapped_features])
+            with span("predict"):
+                encoded, proba = compiled.predict(X)
+            return {
+                "predicted_label": str(label_encoder.inverse_transform(encoded)[0]),
+                "predicted_proba": proba[0].tolist()
+            }
+
+        with span("feature_engineering"):
+            X = pd.DataFrame([mapped_features])
+        with span("predict"):
+            pred_encoded = pipeline.predict(X)[0]
 
-        # Decode label
-        pred_label = label_encoder.inverse_transform([pred_encoded])[0]
+            # Decode label
+            pred_label = label_encoder.inverse_transform([pred_encoded])[0]
 
-        proba = None
-        if hasattr(pipeline, "predict_proba"):
-            proba = pipeline.predict_proba(X)[0].tolist()
+            proba = None
+            if hasattr(pipeline, "predict_proba"):
+                proba = pipeline.predict_proba(X)[0].tolist()
 
         return {
             "predicted_label": str(pred_label),
@@ -81,3 +354,96 @@ def crop_predict(req: CropRequest):
             status_code=500,
             detail=f"{type(e).__name__}: {e}"
         )
+
+
+def _batch_frame(rows: List[Dict[str, Any]]):
+    """
+    Build the training-ordered feature frame for a batch in one pass.
+    Returns (X, errors) where errors maps row index -> message; X holds
+    every row, invalid ones included, and must be filtered by the caller.
+    """
+    raw = pd.DataFrame(rows, index=range(len(rows)))
+    empty = pd.Series(None, index=raw.index, dtype=object)
+
+    columns = {}
+    missing = {}
+    invalid = {}
+    for f in REQUIRED_FEATURES:
+        # training name first, then any frontend alias that maps onto it
+        names = [f] + [k for k, v in FEATURE_MAP.items() if v == f]
+        col = empty
+        for name in names:
+            if name in raw.columns:
+                col = col.combine_first(raw[name]) if col is not empty else raw[name]
+        numeric = pd.to_numeric(col, errors="coerce")
+        missing[f] = col.isna()
+        invalid[f] = numeric.isna() & ~missing[f]
+        columns[f] = numeric.astype(float)
+
+    X = pd.DataFrame(columns, index=raw.index)
+    missing = pd.DataFrame(missing)
+    invalid = pd.DataFrame(invalid)
+
+    errors = {}
+    for i in X.index[missing.any(axis=1) | invalid.any(axis=1)]:
+        parts = []
+        m = [f for f in REQUIRED_FEATURES if missing.at[i, f]]
+        bad = [f for f in REQUIRED_FEATURES if invalid.at[i, f]]
+        if m:
+            parts.append(f"Missing required features: {m}")
+        if bad:
+            parts.append(f"Non-numeric features: {bad}")
+        errors[int(i)] = "; ".join(parts)
+    return X, errors
+
+
+@router.post("/predict/batch", response_model=CropBatchResponse)
+async def crop_predict_batch(req: CropBatchRequest):
+    """
+    Predict many rows with a single predict_proba pass. Invalid rows get a
+    per-row error instead of failing the whole batch.
+    """
+    if len(req.rows) > BATCH_MAX_ROWS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"batch too large: {len(req.rows)} rows (max {BATCH_MAX_ROWS})"
+        )
+    if not req.rows:
+        return {"results": []}
+    return await executor.run(_crop_predict_batch, req)
+
+
+def _crop_predict_batch(req: CropBatchRequest) -> dict:
+    try:
+        entry = registry.get(MODEL_NAME)
+        label_encoder = registry.get(LABEL_ENCODER_NAME).model
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"model load error: {e}")
+
+    with span("feature_engineering"):
+        X, errors = _batch_frame(req.rows)
+    valid = [i for i in range(len(req.rows)) if i not in errors]
+
+    results = [
+        {"index": i, "error": errors[i]} if i in errors else None
+        for i in range(len(req.rows))
+    ]
+    if valid:
+        try:
+            with span("predict"):
+                if entry.compiled is not None:
+                    compiled = entry.compiled
+                    encoded, proba = compiled.predict(X.loc[valid, compiled.order].to_numpy(dtype=np.float64))
+                else:
+                    proba = entry.model.predict_proba(X.loc[valid])
+                    encoded = entry.model.classes_[proba.argmax(axis=1)]
+                labels = label_encoder.inverse_transform(encoded)
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"{type(e).__name__}: {e}"
+            )
+        for i, label, p in zip(valid, labels, proba.tolist()):
+            results[i] = {"index": i, "predicted_label": str(label), "predicted_proba": p}
+
+    return {"results": results}
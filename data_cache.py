@@ -0,0 +1,195 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from streamlit_app.common import api_client
+
+# Seconds a cached answer is used without asking the backend at all; after
+# that it is revalidated with If-None-Match, which is a cheap 304 while the
+# backend's ETag (e.g. the price model version) is unchanged.
+CATALOG_TTL = float(os.getenv("UI_CATALOG_TTL", "300"))
+METADATA_TTL = float(os.getenv("UI_METADATA_TTL", "900"))
+SEARCH_TTL = float(os.getenv("UI_SEARCH_TTL", "60"))
+# Every search query and page is its own key, so the cache is bounded: least
+# recently used entries go first, and an expired entry is only kept this many
+# seconds longer in case its ETag still revalidates
+MAX_ENTRIES = int(os.getenv("UI_CACHE_MAX_ENTRIES", "512"))
+STALE_KEEP = float(os.getenv("UI_CACHE_STALE_KEEP", "600"))
+
+# key -> (value, etag, expires_at), least recently used first; module level,
+# so shared by every session
+_entries = OrderedDict()
+# key -> [lock, sessions using it]; only held while a key is being fetched
+_key_locks = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def _key_lock(key):
+    with _lock:
+        held = _key_locks.setdefault(key, [threading.Lock(), 0])
+        held[1] += 1
+    try:
+        with held[0]:
+            yield
+    finally:
+        with _lock:
+            held[1] -= 1
+            if not held[1]:
+                del _key_locks[key]
+
+
+def _lookup(key):
+    """(entry or None, fresh) for key, marking it recently used."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None, False
+        _entries.move_to_end(key)
+        return entry, entry[2] > time.monotonic()
+
+
+def _store(key, entry):
+    with _lock:
+        _entries[key] = entry
+        _entries.move_to_end(key)
+        cutoff = time.monotonic() - STALE_KEEP
+        for k in [k for k, e in _entries.items() if e[2] < cutoff]:
+            del _entries[k]
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+
+def _key(path, params):
+    return (path, tuple(sorted((params or {}).items())))
+
+
+def cached_get(path, params=None, ttl=CATALOG_TTL):
+    """
+    JSON of GET `path`, cached process-wide for `ttl` seconds.
+
+    Streamlit reruns the page script on every widget change; this keeps those
+    reruns off the network. Concurrent sessions missing the same key wait for
+    one fetch. The returned object is shared: treat it as read-only.
+    """
+    key = _key(path, params)
+    entry, fresh = _lookup(key)
+    if fresh:
+        return entry[0]
+    with _key_lock(key):
+        entry, fresh = _lookup(key)
+        if fresh:
+            return entry[0]
+        data, etag = api_client.conditional_get(path, params, entry[1] if entry else None)
+        if data is None:
+            data = entry[0]
+        _store(key, (data, etag, time.monotonic() + ttl))
+        return data
+
+
+def cached_gather(*requests):
+    """
+    cached_get for several independent (path, params, ttl) requests, e.g.
+    from products_request() and search_request(). Fresh answers come from
+    the cache; the rest are fetched concurrently by one api_client.gather
+    call (still revalidating with If-None-Match). A ttl of None fetches
+    without caching. Returns the JSON bodies in request order.
+    """
+    keys = [_key(path, params) for path, params, _ in requests]
+    data = {}
+    for key, (_, _, ttl) in zip(keys, requests):
+        entry, fresh = _lookup(key) if ttl is not None else (None, False)
+        if fresh:
+            data[key] = entry[0]
+    if len(data) == len(set(keys)):
+        return [data[key] for key in keys]
+
+    missing = {key for key, (_, _, ttl) in zip(keys, requests) if ttl is not None and key not in data}
+    with ExitStack() as stack:
+        # taken in the same order by every session, so gathers cannot deadlock
+        for key in sorted(missing, key=repr):
+            stack.enter_context(_key_lock(key))
+
+        pending = {}  # key -> (path, params, ttl, stale entry); each key fetched once
+        for key, (path, params, ttl) in zip(keys, requests):
+            if key in data or key in pending:
+                continue
+            entry, fresh = _lookup(key) if ttl is not None else (None, False)
+            if fresh:
+                data[key] = entry[0]  # another session fetched it meanwhile
+            else:
+                pending[key] = (path, params, ttl, entry)
+
+        if pending:
+            fetched = api_client.gather(*(
+                lambda api, path=path, params=params, entry=entry:
+                    api.conditional_get(path, params, entry[1] if entry else None)
+                for path, params, _, entry in pending.values()
+            ))
+            for (key, (_, _, ttl, entry)), (body, etag) in zip(pending.items(), fetched):
+                data[key] = entry[0] if body is None else body
+                if ttl is not None:
+                    _store(key, (data[key], etag, time.monotonic() + ttl))
+    return [data[key] for key in keys]
+
+
+def invalidate(path=None):
+    """Drop cached answers for `path` (all paths if None)."""
+    with _lock:
+        for key in [k for k in _entries if path is None or k[0] == path]:
+            del _entries[key]
+
+
+# (path, params, ttl) for cached_get / cached_gather
+
+def products_request(limit=50, skip=0, fields=None):
+    params = {"limit": limit, "skip": skip}
+    if fields:
+        params["fields"] = fields
+    return "/products/", params, CATALOG_TTL
+
+
+def search_request(q="", category=None, limit=50, offset=0, fields=None):
+    params = {"q": q, "limit": limit, "offset": offset}
+    if category:
+        params["category"] = category
+    if fields:
+        params["fields"] = fields
+    return "/products/search", params, SEARCH_TTL
+
+
+CATEGORIES_REQUEST = ("/price/categories", None, METADATA_TTL)
+STATES_REQUEST = ("/price/states", None, METADATA_TTL)
+
+
+def recommend_request(sku, k=8):
+    """Not cached: recommendations follow the neighbors job."""
+    return f"/recommend/sku/{sku}", {"k": k}, None
+
+
+def list_products(limit=50, skip=0, fields=None):
+    """Cached api_client.list_products."""
+    return cached_get(*products_request(limit, skip, fields))
+
+
+def search_products(q="", category=None, limit=50, offset=0, fields=None):
+    """Cached api_client.search_products (one entry per query, filter and page)."""
+    return cached_get(*search_request(q, category, limit, offset, fields))
+
+
+def get_price_categories():
+    """Cached api_client.get_price_categories; revalidated against the price model version."""
+    return cached_get(*CATEGORIES_REQUEST)["categories"]
+
+
+def get_price_states():
+    """Cached api_client.get_price_states; revalidated against the price model version."""
+    return cached_get(*STATES_REQUEST)["states"]
+
+
+def price_options():
+    """(categories, states), fetched together when either needs the network."""
+    categories, states = cached_gather(CATEGORIES_REQUEST, STATES_REQUEST)
+    return categories["categories"], states["states"]
@@ -11,8 +11,28 @@ DB_NAME = os.getenv("DB_NAME", "hawkins_farm")
 if not MONGO_URI:
     raise RuntimeError("MONGO_URI env var is required. Set it in your environment or .env file")
 
-_client = MongoClient(MONGO_URI, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=20000)
+# MONGO_URI=mongomock:// runs everything against an in-memory stand-in
+USE_STANDIN = MONGO_URI.startswith("mongomock://")
+
+if USE_STANDIN:
+    from .mongo_standin import create_clients
+    _client, _async_client = create_clients()
+else:
+    # pymongo's native asyncio client (pymongo >= 4.13)
+    from pymongo import AsyncMongoClient
+    from .metrics import MongoCommandListener
+    # counts round trips and times them for /metrics
+    _listeners = [MongoCommandListener()]
+    # connect=False: nothing is opened before app.launcher forks its workers
+    _client = MongoClient(MONGO_URI, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=20000,
+                          event_listeners=_listeners, connect=False)
+    _async_client = AsyncMongoClient(MONGO_URI, tlsCAFile=certifi.where(), serverSelectionTimeoutMS=20000,
+                                     event_listeners=_listeners)
+
+# Sync handle: startup, background threads (registry, watcher, neighbor index) and offline jobs
 db = _client[DB_NAME]
+# Async handle: request handlers, so a Mongo round trip does not hold a worker thread
+adb = _async_client[DB_NAME]
 
 def products_collection():
     return db["products"]
@@ -22,3 +42,30 @@ def transactions_collection():
 
 def neighbors_collection():
     return db["item_neighbors"]
+
+def async_products_collection():
+    return adb["products"]
+
+def async_transactions_collection():
+    return adb["transactions"]
+
+def async_neighbors_collection():
+    return adb["item_neighbors"]
+
+def async_models_collection():
+    return adb["models"]
+
+def gridfs_bucket():
+    """Async GridFS bucket (default "fs" prefix, same files as gridfs.GridFS(db))."""
+    if USE_STANDIN:
+        from .mongo_standin import AsyncGridFSBucket
+        return AsyncGridFSBucket(db)
+    from gridfs import AsyncGridFSBucket
+    return AsyncGridFSBucket(adb)
+
+def ensure_indexes():
+    """Idempotent; called once at startup."""
+    # keyset pagination for GET /products
+    products_collection().create_index([("units_sold", -1), ("_id", 1)])
+    # newest neighbor list, read on every neighbor index refresh (latest_computed_at)
+    neighbors_collection().create_index([("computed_at", -1)])
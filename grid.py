@@ -0,0 +1,122 @@
+import html
+import json
+import math
+
+import streamlit.components.v1 as components
+
+# Pixel height of one grid row per card variant (card + gap), used to size the iframe
+ROW_HEIGHT = {"tile": 340, "row": 110}
+
+GRID_CSS = """
+body { margin:0; font-family:"Source Sans Pro", sans-serif; background:transparent; }
+.grid { display:grid; gap:20px; padding:4px 6px 8px; }
+.card {
+    background:#0B3F43;
+    border-radius:16px;
+    box-shadow:0 8px 22px rgba(11,63,67,0.55);
+    color:#ffffff;
+    transition: transform 0.25s ease, box-shadow 0.25s ease, filter 0.25s ease;
+    box-sizing:border-box;
+    overflow:hidden;
+}
+.card:hover {
+    transform:scale(1.03);
+    box-shadow:0 14px 36px rgba(11,63,67,0.75);
+    filter:brightness(1.05);
+}
+.card img { object-fit:cover; background:#083344; display:block; }
+.title { font-size:1.05rem; font-weight:600; color:#D1FAE5; margin-bottom:4px; }
+.line { font-size:0.9rem; }
+
+/* products grid: image on top */
+.tile { padding:16px; height:320px; }
+.tile img { width:100%; height:180px; border-radius:12px; margin-bottom:12px; }
+.tile .line { font-size:0.75rem; color:#B2DFDB; margin-bottom:10px; }
+.badge {
+    display:inline-block; background:#134E4A; color:#ECFEFF;
+    padding:4px 12px; border-radius:999px; font-size:0.75rem;
+}
+
+/* recommendation list: icon on the left */
+.row { padding:16px 18px; display:flex; align-items:center; gap:14px; height:92px; color:#ECFEFF; }
+.row img {
+    width:56px; height:56px; border-radius:12px; flex-shrink:0;
+    box-shadow:0 4px 12px rgba(0,0,0,0.35);
+}
+.row .title { color:#D1FAF5; }
+"""
+
+# Images given by URL are left to the browser (loading="lazy"). Inline data:
+# URIs are sent once per distinct image and assigned when a card comes within
+# 400px of the viewport.
+LAZY_JS = """
+const imgs = document.querySelectorAll("img[data-img]");
+const load = (img) => { img.src = IMAGES[img.dataset.img]; img.removeAttribute("data-img"); };
+if ("IntersectionObserver" in window) {
+    const io = new IntersectionObserver((entries) => {
+        for (const e of entries) {
+            if (e.isIntersecting) { load(e.target); io.unobserve(e.target); }
+        }
+    }, { rootMargin: "400px" });
+    imgs.forEach((img) => io.observe(img));
+} else {
+    imgs.forEach(load);
+}
+"""
+
+
+def card(image=None, title="", lines=(), badge=None) -> dict:
+    """One grid card; text is escaped when rendered."""
+    return {"image": image, "title": title, "lines": list(lines), "badge": badge}
+
+
+def grid_html(cards, variant: str = "tile", columns: int = 3) -> str:
+    """A single HTML document for all `cards`, with shared CSS and lazily loaded images."""
+    images = {}
+    parts = []
+    for c in cards:
+        img = ""
+        src = c.get("image")
+        if src and src.startswith("data:"):
+            key = images.setdefault(src, str(len(images)))
+            img = f'<img data-img="{key}" alt="" decoding="async">'
+        elif src:
+            img = f'<img src="{html.escape(src)}" loading="lazy" alt="" decoding="async">'
+        lines = "".join(f'<div class="line">{html.escape(str(l))}</div>' for l in c.get("lines", ()))
+        badge = f'<span class="badge">{html.escape(str(c["badge"]))}</span>' if c.get("badge") else ""
+        title = f'<div class="title">{html.escape(str(c.get("title", "")))}</div>'
+        body = f"{title}{lines}{badge}"
+        if variant == "row":
+            body = f"<div>{body}</div>"
+        parts.append(f'<div class="card {variant}">{img}{body}</div>')
+
+    script = ""
+    if images:
+        image_map = json.dumps({key: uri for uri, key in images.items()})
+        script = f"<script>const IMAGES = {image_map};{LAZY_JS}</script>"
+    return (
+        f"<style>{GRID_CSS}</style>"
+        f'<div class="grid" style="grid-template-columns:repeat({columns}, minmax(0, 1fr));">'
+        f'{"".join(parts)}</div>'
+        f"{script}"
+    )
+
+
+def render_grid(cards, variant: str = "tile", columns: int = 3, max_height: int | None = None):
+    """
+    Render a page of cards as one component (one iframe) instead of one per
+    card. The iframe is sized to fit; with `max_height` it scrolls inside
+    instead, and images outside the visible area are not fetched. Pass image
+    URLs (assets.image_url) rather than data: URIs for long grids, so the
+    page does not carry every image's bytes.
+    """
+    if not cards:
+        return
+    rows = math.ceil(len(cards) / columns)
+    height = rows * ROW_HEIGHT[variant] + 16
+    scrolling = max_height is not None and height > max_height
+    components.html(
+        grid_html(cards, variant, columns),
+        height=min(height, max_height) if scrolling else height,
+        scrolling=scrolling,
+    )
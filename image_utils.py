@@ -1,6 +1,8 @@
 import base64
 from pathlib import Path
 
+from streamlit_app.common.assets import HERO, image_b64
+
 BASE_DIR = Path(__file__).resolve().parents[1]
 
 def load_local_image(rel_path: str):
@@ -19,5 +21,7 @@ def get_crop_image(crop_name: str):
     if not crop_name:
         return None
 
+    # base64 of a cached, resized JPEG (the page wraps it in a data:image/jpeg URI)
     crop_name = crop_name.lower().strip()
-    return load_local_image(f"assets/crops/{crop_name}.jpg")
+    found = image_b64(BASE_DIR / f"assets/crops/{crop_name}.jpg", HERO, "JPEG")
+    return found[1] if found else None
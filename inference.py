@@ -0,0 +1,130 @@
+# inference.py
+"""
+Dedicated executor for CPU-bound model inference.
+
+The prediction routes run their model work here rather than in Starlette's
+default threadpool, which also serves every other sync route. A slow or
+busy model can then only use INFERENCE_WORKERS threads. At most
+INFERENCE_QUEUE further calls wait behind them. Anything beyond that is
+refused at once with 503 + Retry-After instead of queueing without bound:
+
+    return await executor.run(_predict_sync, req)
+
+INFERENCE_CPUS (e.g. "2-3") pins the inference threads to those CPUs.
+INFERENCE_XGB_NTHREAD is the XGBoost nthread each booster is set to, so
+the worker count bounds the number of busy cores.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Set
+
+from fastapi import HTTPException
+
+from .metrics import STAGE_SECONDS
+
+WORKERS = int(os.getenv("INFERENCE_WORKERS", str(min(4, os.cpu_count() or 1))))
+QUEUE_SIZE = int(os.getenv("INFERENCE_QUEUE", str(4 * WORKERS)))
+RETRY_AFTER = int(os.getenv("INFERENCE_RETRY_AFTER", "1"))
+XGB_NTHREAD = int(os.getenv("INFERENCE_XGB_NTHREAD", "1"))
+CPUS = os.getenv("INFERENCE_CPUS", "")
+
+
+def parse_cpus(spec: str) -> Optional[Set[int]]:
+    """'0,2-3' -> {0, 2, 3}; '' -> None (no pinning)."""
+    cpus = set()
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        lo, _, hi = part.partition("-")
+        cpus.update(range(int(lo), int(hi or lo) + 1))
+    return cpus or None
+
+
+def _pin(cpus: Optional[Set[int]]):
+    # on Linux the affinity of pid 0 is the calling thread's
+    if cpus and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+
+
+class InferenceExecutor:
+    """
+    Thread pool with `workers` threads and room for `queue_size` waiting
+    calls. A slot is held until the call finishes, even if the request
+    awaiting it was cancelled, so the bound covers work really in progress.
+    The pool is started on first use and again after shutdown(), so the
+    module-level executor outlives one app lifespan (e.g. in tests).
+    """
+
+    def __init__(self, workers: int = WORKERS, queue_size: int = QUEUE_SIZE, cpus: str = CPUS,
+                 retry_after: int = RETRY_AFTER):
+        self.workers = workers
+        self.capacity = workers + queue_size
+        self.retry_after = retry_after
+        self._cpus = parse_cpus(cpus)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) on the pool; HTTPException(503) at once when it is full."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HTTPException(
+                status_code=503,
+                detail="inference capacity exceeded, retry later",
+                headers={"Retry-After": str(self.retry_after)},
+            )
+        with self._lock:
+            self.in_flight += 1
+        submitted = time.perf_counter()
+        # keeps per-request metrics state (Mongo round trips, spans) attached
+        ctx = contextvars.copy_context()
+
+        def call():
+            STAGE_SECONDS.observe(time.perf_counter() - submitted, "inference_queue")
+            return ctx.run(fn, *args)
+
+        try:
+            future = self._get_pool().submit(call)
+        except BaseException:
+            self._release()
+            raise
+        future.add_done_callback(self._done)
+        return await asyncio.wrap_future(future)
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="inference",
+                                                initializer=_pin, initargs=(self._cpus,))
+            return self._pool
+
+    def _done(self, future):
+        with self._lock:
+            self.completed += 1
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"workers": self.workers, "capacity": self.capacity, "in_flight": self.in_flight,
+                    "completed": self.completed, "rejected": self.rejected}
+
+    def shutdown(self):
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+executor = InferenceExecutor()
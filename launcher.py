@@ -0,0 +1,294 @@
+# launcher.py
+"""
+Pre-forking multi-worker server for main.py's app.
+
+    python -m app.launcher --workers 4 --port 8000            # preload (default)
+    python -m app.launcher --workers 4 --no-preload           # every worker loads its own models
+
+With --preload the parent imports the app, loads every registered model
+through the registry (validation and compilation included) and freezes
+the garbage collector before forking, so workers start with the models
+already in memory and share those pages copy-on-write instead of each
+unpickling a private copy. Numpy arrays of at least --share-min-bytes in
+the loaded artifacts and their compiled fast paths are also moved into
+read-only shared memory, which no worker can dirty. Arrays joblib already
+memory-mapped from disk (MODEL_MMAP_MODE) are shared through the page cache
+and left alone.
+
+The parent never talks to Mongo, so no pymongo sockets or monitor threads
+exist when it forks: preload reads the local model files only, and a model
+without one is left for each worker to load. Newer GridFS uploads are
+swapped in per worker by its model watcher, which checks for them at startup.
+
+GET /health reports each worker's RSS next to the part of it that is
+shared (and PSS, the fair share), read from /proc/<pid>/smaps_rollup.
+
+OMP_NUM_THREADS defaults to 1 here: OpenMP thread pools created in the
+parent (by XGBoost smoke predictions) do not survive fork, and one
+inference thread per worker is the right split when every core runs a
+worker anyway.
+"""
+import argparse
+import gc
+import logging
+import mmap
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, List, Optional
+
+from fastapi import APIRouter
+
+LOGGER = logging.getLogger(__name__)
+
+# set in the parent before fork; workers read them for /health
+LAUNCHER_PID_ENV = "APP_LAUNCHER_PID"
+PRELOADED_ENV = "APP_PRELOADED"
+SHARE_MIN_BYTES = int(os.getenv("SHARED_ARRAY_MIN_BYTES", str(1024 * 1024)))
+# a worker that dies sooner than this after starting is not restarted in a loop
+RESTART_BACKOFF = 1.0
+
+
+# --------------------------------------------------------------------------- shared arrays
+
+def _to_shared(arr):
+    import numpy as np
+
+    buf = mmap.mmap(-1, arr.nbytes)  # anonymous MAP_SHARED: inherited by forked workers
+    order = "F" if arr.flags.f_contiguous and not arr.flags.c_contiguous else "C"
+    shared = np.ndarray(arr.shape, dtype=arr.dtype, buffer=buf, order=order)
+    shared[...] = arr
+    shared.setflags(write=False)
+    return shared
+
+
+def share_arrays(obj, min_bytes: int = SHARE_MIN_BYTES, _seen: Optional[set] = None) -> int:
+    """
+    Replace plain in-memory numpy arrays of at least `min_bytes` reachable
+    from `obj` (attributes, dicts, lists) with read-only copies in shared
+    memory. Returns the number of bytes moved. Object arrays, memmaps and
+    state hidden inside extension types are left as they are.
+    """
+    import numpy as np
+
+    seen = set() if _seen is None else _seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    def convert(value):
+        if type(value) is np.ndarray and value.nbytes >= min_bytes and not value.dtype.hasobject:
+            return _to_shared(value), value.nbytes
+        return value, share_arrays(value, min_bytes, seen)
+
+    moved = 0
+    if isinstance(obj, dict):
+        for k, v in list(obj.items()):
+            obj[k], n = convert(v)
+            moved += n
+    elif isinstance(obj, list):
+        for i, v in enumerate(obj):
+            obj[i], n = convert(v)
+            moved += n
+    elif isinstance(obj, tuple):
+        for v in obj:
+            moved += share_arrays(v, min_bytes, seen)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        for k, v in list(vars(obj).items()):
+            new, n = convert(v)
+            if new is not v:
+                setattr(obj, k, new)
+            moved += n
+    return moved
+
+
+def preload(min_bytes: int = SHARE_MIN_BYTES):
+    """
+    Load every registered model that has a local file in this (parent)
+    process and share its large arrays. GridFS is not consulted: that would
+    open the sync MongoClient, whose connections must not cross the fork.
+    """
+    from .model_registry import registry
+
+    registry.load_all(disk_only=True)
+    moved = 0
+    for name in registry.names():
+        if registry.version(name) is None:
+            continue  # not loaded (logged by load_all, e.g. GridFS-only); the workers load it
+        entry = registry.get(name)
+        seen: set = set()
+        moved += share_arrays(entry.model, min_bytes, seen)
+        if entry.compiled is not None:
+            moved += share_arrays(entry.compiled, min_bytes, seen)
+    LOGGER.info("preloaded %s; %.1f MiB of arrays in shared memory", registry.names(), moved / 2 ** 20)
+
+
+# --------------------------------------------------------------------------- memory report
+
+def _smaps_rollup(pid: int) -> Optional[Dict[str, float]]:
+    """Rss / Pss / shared / private of `pid` in MiB (Linux only)."""
+    fields: Dict[str, int] = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                parts = value.split()
+                if len(parts) == 2 and parts[1] == "kB":
+                    fields[key] = int(parts[0])
+    except OSError:
+        return None
+    mib = lambda kb: round(kb / 1024, 1)
+    return {
+        "rss_mb": mib(fields.get("Rss", 0)),
+        "pss_mb": mib(fields.get("Pss", 0)),
+        "shared_mb": mib(fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)),
+        "private_mb": mib(fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)),
+    }
+
+
+def _children(ppid: int) -> List[int]:
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # the command name may contain spaces; fields after ")" are fixed
+                stat = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(stat[1]) == ppid:
+            pids.append(int(entry))
+    return sorted(pids)
+
+
+def worker_memory() -> dict:
+    """Memory of the launcher and all of its workers, or of this process alone."""
+    me = os.getpid()
+    launcher = int(os.getenv(LAUNCHER_PID_ENV, "0"))
+    pids = _children(launcher) if launcher and os.path.isdir("/proc") else [me]
+    workers = [{"pid": pid, "self": pid == me, **(_smaps_rollup(pid) or {})} for pid in pids]
+    report = {"workers": workers}
+    if launcher:
+        report["launcher"] = {"pid": launcher, **(_smaps_rollup(launcher) or {})}
+    if all("rss_mb" in w for w in workers):
+        report["total_rss_mb"] = round(sum(w["rss_mb"] for w in workers), 1)
+        # what the workers really cost together: shared pages are counted once
+        report["total_pss_mb"] = round(sum(w["pss_mb"] for w in workers), 1)
+    return report
+
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/health", summary="Liveness plus per-worker RSS vs shared memory")
+def health():
+    from .model_registry import registry
+
+    return {
+        "status": "ok",
+        "pid": os.getpid(),
+        "preloaded": os.getenv(PRELOADED_ENV) == "1",
+        "models": registry.loaded(),
+        **worker_memory(),
+    }
+
+
+# --------------------------------------------------------------------------- process management
+
+def _serve(app, sock: socket.socket, log_level: str):
+    import uvicorn
+
+    for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGHUP):
+        signal.signal(sig, signal.SIG_DFL)
+    uvicorn.Server(uvicorn.Config(app, log_level=log_level)).run(sockets=[sock])
+
+
+def _spawn(app, sock, log_level) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _serve(app, sock, log_level)
+        except BaseException:
+            LOGGER.exception("worker %s crashed", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    return pid
+
+
+def run(args):
+    os.environ[LAUNCHER_PID_ENV] = str(os.getpid())
+    os.environ[PRELOADED_ENV] = "1" if args.preload else "0"
+    from .main import app
+
+    if args.preload:
+        preload(args.share_min_bytes)
+    # keep the collector from touching (and un-sharing) everything loaded so far
+    gc.freeze()
+
+    sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    workers: Dict[int, float] = {}
+    for _ in range(args.workers):
+        workers[_spawn(app, sock, args.log_level)] = time.monotonic()
+    LOGGER.info("serving on %s:%s with %d workers %s", args.host, args.port, len(workers), sorted(workers))
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(workers):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = workers.pop(pid, None)
+        if started is None or stopping:
+            continue
+        LOGGER.warning("worker %s exited (%s), restarting", pid, os.waitstatus_to_exitcode(status))
+        if time.monotonic() - started < RESTART_BACKOFF:
+            time.sleep(RESTART_BACKOFF)
+        workers[_spawn(app, sock, args.log_level)] = time.monotonic()
+    sock.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1))))
+    parser.add_argument("--preload", action=argparse.BooleanOptionalAction, default=True,
+                        help="load models in the parent before forking (default: on)")
+    parser.add_argument("--share-min-bytes", type=int, default=SHARE_MIN_BYTES,
+                        help="move numpy arrays at least this large into shared memory")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    if not hasattr(os, "fork"):
+        parser.error("the launcher needs os.fork(); use uvicorn directly on this platform")
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(process)d %(levelname)s %(message)s",
+                        stream=sys.stderr)
+    run(args)
+
+
+if __name__ == "__main__":
+    # before numpy / xgboost start their thread pools
+    os.environ.setdefault("OMP_NUM_THREADS", "1")
+    main()
@@ -1,5 +1,16 @@
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+
+from app.db import ensure_indexes
+from app.model_registry import registry
+from app.model_watcher import ModelWatcher
+from app import launcher, metrics, neighbor_index, profiling, search_index
+from app.prediction_cache import cache_stats
+from app.inference import executor as inference_executor
 
 from app.routes.products import router as products_router
 from app.routes.recommender import router as recommender_router
@@ -7,8 +18,46 @@ from app.routes.price import router as price_router
 from app.routes.models_fs import router as models_fs_router
 from app.routes.crop_classifier import router as crop_router
 
+LOGGER = logging.getLogger(__name__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        ensure_indexes()
+    except Exception:
+        LOGGER.exception("could not create indexes")
+    # routers registered their artifacts on import; load them once here
+    # (unless app.launcher already did, before forking this worker)
+    registry.load_all(missing_only=True)
+    # then pick up newer GridFS uploads in the background
+    watcher = ModelWatcher(registry)
+    watcher.start()
+    # /recommend/sku is served from memory once the neighbor index is built
+    try:
+        neighbor_index.refresh(force=True)
+    except Exception:
+        LOGGER.exception("neighbor index load failed; using Mongo")
+    refresher = neighbor_index.NeighborIndexRefresher()
+    refresher.start()
+    # /products/search likewise, with a Mongo regex fallback
+    try:
+        search_index.refresh()
+    except Exception:
+        LOGGER.exception("search index load failed; using Mongo")
+    search_refresher = search_index.SearchIndexRefresher()
+    search_refresher.start()
+    yield
+    search_refresher.stop()
+    inference_executor.shutdown()
+    refresher.stop()
+    watcher.stop()
+
 
-app = FastAPI(title="Hawkins Farm - ML Service")
+app = FastAPI(
+    title="Hawkins Farm - ML Service",
+    lifespan=lifespan,
+    default_response_class=metrics.TimedJSONResponse,
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -17,12 +66,51 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(profiling.ProfilingMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
 app.include_router(products_router)
 app.include_router(recommender_router)
 app.include_router(price_router)
 app.include_router(models_fs_router)
 app.include_router(crop_router)
+app.include_router(profiling.router)
+app.include_router(launcher.router)
 
 from app.routes.crop_classifier import router as debug_crop_router
 app.include_router(debug_crop_router)
+
+
+def _prediction_cache_metrics():
+    stats = cache_stats()
+    return (
+        metrics.gauge_lines("prediction_cache_hits_total", "Prediction cache hits.",
+                            [({"cache": c["name"]}, c["hits"]) for c in stats], kind="counter")
+        + metrics.gauge_lines("prediction_cache_misses_total", "Prediction cache misses.",
+                              [({"cache": c["name"]}, c["misses"]) for c in stats], kind="counter")
+        + metrics.gauge_lines("prediction_cache_hit_ratio", "Prediction cache hits / lookups.",
+                              [({"cache": c["name"]}, c["hit_rate"]) for c in stats])
+        + metrics.gauge_lines("prediction_cache_entries", "Prediction cache size.",
+                              [({"cache": c["name"]}, c["size"]) for c in stats])
+    )
+
+
+metrics.register_collector(_prediction_cache_metrics)
+
+
+def _inference_metrics():
+    stats = inference_executor.stats()
+    return (
+        metrics.gauge_lines("inference_in_flight", "Inference calls running or queued.", [({}, stats["in_flight"])])
+        + metrics.gauge_lines("inference_capacity", "Inference workers + queue slots.", [({}, stats["capacity"])])
+        + metrics.gauge_lines("inference_rejected_total", "Inference calls refused with 503.",
+                              [({}, stats["rejected"])], kind="counter")
+    )
+
+
+metrics.register_collector(_inference_metrics)
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
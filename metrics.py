@@ -0,0 +1,225 @@
+# metrics.py
+"""
+In-process request / stage metrics in Prometheus text format (GET /metrics).
+
+    with span("predict"):
+        y = model.predict(X)
+
+MetricsMiddleware times every request per route template and counts the
+Mongo commands it issued (MongoCommandListener, attached to both clients
+in db.py; the async client runs its callbacks in the request's task).
+Spans record per-stage latencies: model_load, feature_engineering,
+dmatrix_build, predict, mongo_query and serialization (plus
+inference_queue, the wait for an inference worker).
+"""
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from fastapi.responses import JSONResponse
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set; observe() is a lock and a bisect."""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for labels, counts, total, n in sorted(series):
+            acc = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                acc += c
+                le = 'le="%s"' % _num(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total!r}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, labels)} {n}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        out += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in items]
+        return out
+
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Request latency by route template.", ("method", "route", "status")
+)
+STAGE_SECONDS = Histogram("stage_duration_seconds", "Latency of instrumented stages.", ("stage",))
+MONGO_PER_REQUEST = Histogram(
+    "mongo_round_trips_per_request", "Mongo commands issued while serving one request.", ("route",), COUNT_BUCKETS
+)
+MONGO_COMMANDS = Counter("mongo_commands_total", "Mongo commands by name and outcome.", ("command", "outcome"))
+
+_METRICS = [REQUEST_SECONDS, STAGE_SECONDS, MONGO_PER_REQUEST, MONGO_COMMANDS]
+# callables returning extra exposition lines (e.g. cache stats), evaluated per scrape
+_collectors: List[Callable[[], List[str]]] = []
+
+
+def register_collector(fn: Callable[[], List[str]]):
+    _collectors.append(fn)
+
+
+def gauge_lines(name: str, help: str, samples: Sequence[Tuple[dict, float]], kind: str = "gauge") -> List[str]:
+    """Exposition lines for values read at scrape time: samples are (labels, value)."""
+    out = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        out.append(f"{name}{_labels(list(labels), list(labels.values()))} {_num(value)}")
+    return out
+
+
+def render() -> str:
+    lines: List[str] = []
+    for m in _METRICS:
+        lines += m.render()
+    for fn in _collectors:
+        lines += fn()
+    return "\n".join(lines) + "\n"
+
+
+_active_stage: ContextVar[Optional[str]] = ContextVar("active_stage", default=None)
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time a block into stage_duration_seconds{stage=...}. Stages do not
+    nest: inside another span (e.g. the reference check predictions run
+    during model_load) only the outer one is recorded.
+    """
+    if _active_stage.get() is not None:
+        yield
+        return
+    token = _active_stage.set(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage)
+        _active_stage.reset(token)
+
+
+class _RequestStats:
+    __slots__ = ("mongo",)
+
+    def __init__(self):
+        self.mongo = 0
+
+
+_request_stats: ContextVar[Optional[_RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Counts Mongo round trips (per request when inside one) and times them as mongo_query."""
+
+    def started(self, event):
+        stats = _request_stats.get()
+        if stats is not None:
+            stats.mongo += 1
+
+    def succeeded(self, event):
+        MONGO_COMMANDS.inc(event.command_name, "ok")
+        STAGE_SECONDS.observe(event.duration_micros / 1e6, "mongo_query")
+
+    def failed(self, event):
+        MONGO_COMMANDS.inc(event.command_name, "error")
+        STAGE_SECONDS.observe(event.duration_micros / 1e6, "mongo_query")
+
+
+class TimedJSONResponse(JSONResponse):
+    """Default response class: JSON encoding is timed as the serialization stage."""
+
+    def render(self, content) -> bytes:
+        with span("serialization"):
+            return super().render(content)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: one histogram observation and one round-trip count per request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        stats = _RequestStats()
+        token = _request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stats.reset(token)
+            # the route template, not the raw path, keeps label cardinality bounded
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "<unmatched>"
+            REQUEST_SECONDS.observe(elapsed, scope["method"], path, status[0])
+            MONGO_PER_REQUEST.observe(stats.mongo, path)
@@ -0,0 +1,100 @@
+# model_cache.py
+import os
+import tempfile
+import logging
+from typing import Optional
+
+import gridfs
+
+from .db import db
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "hawkins_model_cache"))
+CACHE_MAX_BYTES = int(os.getenv("MODEL_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+
+SUFFIX = ".joblib"
+
+
+def cache_key(doc: dict) -> Optional[str]:
+    """Content hash recorded at upload (md5) when present, else the GridFS id."""
+    if doc.get("md5"):
+        return f"md5-{doc['md5']}"
+    if doc.get("gridfs_id"):
+        return f"id-{doc['gridfs_id']}"
+    return None
+
+
+def _path(key: str) -> str:
+    return os.path.join(CACHE_DIR, key + SUFFIX)
+
+
+def fetch(doc: dict) -> Optional[str]:
+    """
+    Local path of the artifact referenced by a db.models doc, downloading it
+    on a miss.
+
+    Files are content-addressed and immutable, so a hit needs no GridFS
+    round trip. A miss streams the GridFS chunks into a temp file in the
+    cache dir and renames it into place, so concurrent loaders (threads or
+    workers) never see a partial file. Hits bump the mtime, which is the
+    LRU order used by evict().
+    """
+    key = cache_key(doc)
+    if key is None:
+        return None
+    path = _path(key)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    g = gridfs.GridFS(db).get(doc["gridfs_id"])
+    fd, tmp = tempfile.mkstemp(dir=CACHE_DIR, suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            while True:
+                chunk = g.readchunk()
+                if not chunk:
+                    break
+                fh.write(chunk)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    LOGGER.info("model cache: stored %s (%d bytes)", key, os.path.getsize(path))
+    evict(keep=path)
+    return path
+
+
+def evict(keep: Optional[str] = None, max_bytes: int = CACHE_MAX_BYTES):
+    """Drop least recently used artifacts until the cache fits in max_bytes."""
+    try:
+        names = [n for n in os.listdir(CACHE_DIR) if n.endswith(SUFFIX)]
+    except FileNotFoundError:
+        return
+    entries = []
+    for n in names:
+        p = os.path.join(CACHE_DIR, n)
+        try:
+            st = os.stat(p)
+        except FileNotFoundError:
+            continue
+        entries.append((st.st_mtime, st.st_size, p))
+    total = sum(size for _, size, _ in entries)
+    for _, size, p in sorted(entries):
+        if total <= max_bytes:
+            break
+        if p == keep:
+            continue
+        try:
+            # processes that already mmap'd it keep their mapping
+            os.remove(p)
+            total -= size
+            LOGGER.info("model cache: evicted %s", os.path.basename(p))
+        except FileNotFoundError:
+            pass
+
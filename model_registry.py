@@ -0,0 +1,167 @@
+# model_registry.py
+import threading
+import logging
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from .models_loader import load_model_with_version
+from .metrics import span
+
+LOGGER = logging.getLogger(__name__)
+
+
+class ModelEntry:
+    """
+    A loaded artifact together with the version it was loaded from.
+    `compiled` is the optional fast-path object built from the artifact
+    (None when no compiler is registered or compilation failed).
+    """
+
+    __slots__ = ("name", "version", "model", "compiled", "loaded_at")
+
+    def __init__(self, name: str, version: str, model, compiled=None):
+        self.name = name
+        self.version = version
+        self.model = model
+        self.compiled = compiled
+        self.loaded_at = datetime.utcnow()
+
+    def describe(self) -> dict:
+        return {
+            "name": self.name,
+            "version": self.version,
+            "compiled": self.compiled is not None,
+            "loaded_at": self.loaded_at.isoformat(),
+        }
+
+
+class ModelRegistry:
+    """
+    Process-wide store of warm model artifacts.
+
+    Routers register the artifacts they need (name + local path) at import
+    time, main.py loads them once in the FastAPI lifespan, and every request
+    afterwards gets the same in-memory objects. Callers should grab the entry
+    once per request: a reload replaces the entry, it never mutates it, so
+    in-flight requests finish on the version they started with.
+
+    An optional smoke check (a callable that raises on a bad artifact) is run
+    on every new version before it is swapped in. An optional compiler builds
+    a fast-path object from each version; if it raises, the version is still
+    served through the regular path.
+    """
+
+    def __init__(self):
+        self._paths: Dict[str, str] = {}
+        self._smoke: Dict[str, Callable] = {}
+        self._compilers: Dict[str, Callable] = {}
+        self._entries: Dict[str, ModelEntry] = {}
+        self._listeners = []
+        # re-entrant: _load installs while holding it
+        self._load_lock = threading.RLock()
+
+    def register(
+        self,
+        name: str,
+        local_path: str,
+        smoke: Optional[Callable] = None,
+        compiler: Optional[Callable] = None,
+    ):
+        self._paths[name] = local_path
+        if smoke is not None:
+            self._smoke[name] = smoke
+        if compiler is not None:
+            self._compilers[name] = compiler
+
+    def names(self):
+        return list(self._paths)
+
+    def get(self, name: str) -> ModelEntry:
+        """Return the current entry, loading it on first use."""
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry
+        with self._load_lock:
+            # another request may have loaded it while we waited
+            entry = self._entries.get(name)
+            if entry is not None:
+                return entry
+            return self._load(name)
+
+    def reload(self, name: str) -> ModelEntry:
+        """Swap in the current version: the newer of the disk file and the latest GridFS upload."""
+        with self._load_lock:
+            return self._load(name)
+
+    def load_all(self, missing_only: bool = False, disk_only: bool = False):
+        """
+        Load every registered artifact; failures are logged, not raised.
+        disk_only loads the local files without touching Mongo.
+        """
+        for name in self.names():
+            if missing_only and name in self._entries:
+                continue
+            try:
+                with self._load_lock:
+                    entry = self._load(name, disk_only)
+                LOGGER.info("loaded model %s (%s)", name, entry.version)
+            except Exception:
+                LOGGER.exception("failed to load model %s at startup", name)
+
+    def install(self, name: str, version: str, model) -> ModelEntry:
+        """
+        Validate an already-loaded artifact and atomically make it current.
+        Used by the GridFS watcher, which unpickles off the request path.
+        """
+        if name not in self._paths:
+            raise KeyError(f"model '{name}' is not registered")
+        # validation and compilation run predictions; time them as part of the load
+        with span("model_load"):
+            self.validate(name, model)
+            entry = ModelEntry(name, version, model, self._compile(name, model))
+        # single dict assignment: readers see either the old or the new entry;
+        # the lock orders it against a reload deciding what is current
+        with self._load_lock:
+            self._entries[name] = entry
+        for listener in self._listeners:
+            try:
+                listener(name)
+            except Exception:
+                LOGGER.exception("model swap listener failed for %s", name)
+        return entry
+
+    def subscribe(self, listener: Callable):
+        """Call `listener(name)` after every swap (e.g. to drop cached predictions)."""
+        self._listeners.append(listener)
+
+    def validate(self, name: str, model):
+        smoke = self._smoke.get(name)
+        if smoke is not None:
+            smoke(model)
+
+    def _compile(self, name: str, model):
+        compiler = self._compilers.get(name)
+        if compiler is None:
+            return None
+        try:
+            return compiler(model)
+        except Exception:
+            LOGGER.exception("could not compile %s, serving the regular path", name)
+            return None
+
+    def version(self, name: str) -> Optional[str]:
+        entry = self._entries.get(name)
+        return entry.version if entry else None
+
+    def loaded(self):
+        return [e.describe() for e in self._entries.values()]
+
+    def _load(self, name: str, disk_only: bool = False) -> ModelEntry:
+        if name not in self._paths:
+            raise KeyError(f"model '{name}' is not registered")
+        with span("model_load"):
+            model, version = load_model_with_version(name, self._paths[name], disk_only)
+            return self.install(name, version, model)
+
+
+registry = ModelRegistry()
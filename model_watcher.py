@@ -0,0 +1,132 @@
+# model_watcher.py
+import os
+import threading
+import logging
+from typing import Callable, Dict
+
+from .models_loader import doc_is_newer, latest_model_doc, load_from_gridfs_doc
+from .model_registry import ModelRegistry
+from .db import db
+from .metrics import span
+
+LOGGER = logging.getLogger(__name__)
+
+WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "30"))
+# "poll" (default) or "changestream" (needs a replica set, e.g. Atlas)
+WATCH_MODE = os.getenv("MODEL_WATCH_MODE", "poll")
+
+
+class ModelWatcher:
+    """
+    Background thread that picks up new uploads in db.models and hot-swaps
+    them into the registry.
+
+    Downloading, unpickling and the smoke check all happen on this thread;
+    the request path only ever sees the registry's atomic entry swap.
+    `fetch_latest` and `load_doc` default to the Mongo/GridFS helpers and
+    can be replaced by local callables (e.g. a dict of docs) in tests.
+    """
+
+    def __init__(
+        self,
+        registry: ModelRegistry,
+        interval: float = WATCH_INTERVAL,
+        mode: str = WATCH_MODE,
+        fetch_latest: Callable = latest_model_doc,
+        load_doc: Callable = load_from_gridfs_doc,
+    ):
+        self.registry = registry
+        self.interval = interval
+        self.mode = mode
+        self.fetch_latest = fetch_latest
+        self.load_doc = load_doc
+        self._seen: Dict[str, object] = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def seed(self):
+        """
+        Catch up with db.models at startup: install the newest doc per name
+        if it is newer than what the registry loaded (e.g. uploaded while
+        this process was starting), otherwise just remember it as seen.
+        """
+        for name in self.registry.names():
+            doc = self.fetch_latest(name)
+            if doc is None:
+                continue
+            if doc_is_newer(doc, self.registry.version(name)):
+                self.consider(doc)
+            else:
+                self._seen[name] = doc["_id"]
+
+    def poll_once(self):
+        """Check every registered name once; returns the names swapped."""
+        swapped = []
+        for name in self.registry.names():
+            try:
+                doc = self.fetch_latest(name)
+            except Exception:
+                LOGGER.exception("model watcher: lookup failed for %s", name)
+                continue
+            if doc is not None and self.consider(doc):
+                swapped.append(name)
+        return swapped
+
+    def consider(self, doc: dict) -> bool:
+        """Load, validate and install `doc` if it is newer than the last one seen."""
+        name = doc.get("name")
+        if name not in self.registry.names():
+            return False
+        last = self._seen.get(name)
+        if last is not None and not doc["_id"] > last:
+            return False
+        # mark as seen first so a broken artifact is not retried every poll
+        self._seen[name] = doc["_id"]
+        if not doc_is_newer(doc, self.registry.version(name)):
+            return False  # e.g. a reload already picked it up
+        try:
+            with span("model_load"):
+                model = self.load_doc(doc)
+                if model is None:
+                    return False
+                entry = self.registry.install(name, str(doc["_id"]), model)
+        except Exception:
+            LOGGER.exception("model watcher: rejected %s version %s", name, doc["_id"])
+            return False
+        LOGGER.info("model watcher: swapped %s to %s", name, entry.version)
+        return True
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        try:
+            self.seed()
+        except Exception:
+            LOGGER.exception("model watcher: initial lookup failed")
+        if self.mode == "changestream":
+            try:
+                self._tail()
+                return
+            except Exception:
+                LOGGER.exception("model watcher: change stream unavailable, polling instead")
+        while not self._stop.wait(self.interval):
+            self.poll_once()
+
+    def _tail(self):
+        pipeline = [{"$match": {"operationType": "insert"}}]
+        with db.models.watch(pipeline, max_await_time_ms=int(self.interval * 1000)) as stream:
+            while not self._stop.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    self.consider(change["fullDocument"])
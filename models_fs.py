@@ -1,52 +1,171 @@
 # models_fs.py
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, Header, HTTPException, Response
 from fastapi.responses import StreamingResponse
 from bson import ObjectId
-from ..db import db
-import gridfs
-import io
+from ..db import async_models_collection, gridfs_bucket
+from ..model_registry import registry
+from ..prediction_cache import cache_stats
+import hashlib
 
 router = APIRouter(prefix="/models", tags=["models"])
 
-fs = gridfs.GridFS(db)
+# GridFS' default chunk size; uploads are spooled and downloads served in these steps
+CHUNK_SIZE = 255 * 1024
+
+def _content_type(g) -> str:
+    # bucket uploads keep it in metadata, older GridFS.put() uploads at the top level
+    meta = g.metadata or {}
+    return meta.get("contentType") or getattr(g, "content_type", None) or "application/octet-stream"
+
+def _etag(g) -> str:
+    """md5 recorded at upload time, else the (immutable) GridFS _id."""
+    md5 = (g.metadata or {}).get("md5")
+    return f'"{md5 or g._id}"'
+
+def _etag_matches(header: str, etag: str) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _parse_range(header: str, length: int):
+    """
+    (start, end) inclusive for a single "bytes=" range; None means serve the
+    whole file (malformed or multi-range). Raises 416 if unsatisfiable.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    try:
+        if not sep or not (first or last):
+            return None
+        if first:
+            start = int(first)
+            end = int(last) if last else length - 1
+            if last and end < start:
+                return None
+        else:
+            # suffix range: the last N bytes
+            start, end = max(length - int(last), 0), length - 1
+    except ValueError:
+        return None
+    if start >= length or end < 0:
+        raise HTTPException(status_code=416, detail="range not satisfiable",
+                            headers={"Content-Range": f"bytes */{length}"})
+    return start, min(end, length - 1)
+
+async def _iter_file(g, start: int, end: int):
+    """Yield bytes start..end (inclusive) of a GridFS file, a chunk at a time."""
+    if start:
+        await g.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        data = await g.read(min(CHUNK_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+        yield data
 
 @router.post("/upload", summary="Upload model file to GridFS")
 async def upload_model(file: UploadFile = File(...), name: str | None = None):
     """
     Uploads a file to GridFS. Returns the GridFS id (string).
     Use header: Content-Type: multipart/form-data
+
+    The body is copied into GridFS one chunk at a time instead of being read
+    into memory; its md5 is stored in the file metadata for download ETags.
     """
-    contents = await file.read()
-    fid = fs.put(contents, filename=file.filename, contentType=file.content_type, name=name)
+    grid_in = gridfs_bucket().open_upload_stream(file.filename, chunk_size_bytes=CHUNK_SIZE)
+    md5 = hashlib.md5()
+    try:
+        while True:
+            data = await file.read(CHUNK_SIZE)
+            if not data:
+                break
+            md5.update(data)
+            await grid_in.write(data)
+        # written to the files doc on close
+        await grid_in.set("metadata", {"contentType": file.content_type, "name": name, "md5": md5.hexdigest()})
+        await grid_in.close()
+    except Exception:
+        await grid_in.abort()
+        raise
+    fid = grid_in._id
     # save metadata doc
     meta = {
         "filename": file.filename,
         "gridfs_id": fid,
         "content_type": file.content_type,
         "name": name,
+        "md5": md5.hexdigest(),
     }
-    db.models.insert_one({**meta})
+    await async_models_collection().insert_one({**meta})
     return {"file_id": str(fid), "filename": file.filename, "name": name}
 
 @router.get("/download/{file_id}", summary="Download model file from GridFS")
-def download_model(file_id: str):
+async def download_model(
+    file_id: str,
+    range: str | None = Header(None),
+    if_none_match: str | None = Header(None),
+    if_range: str | None = Header(None),
+):
     """
     Download a file stored in GridFS by id (string).
-    Returns a StreamingResponse for direct download.
+    Chunks are streamed straight from GridFS. Supports a single-range
+    `Range: bytes=...` (206, for resuming) and `If-None-Match` (304).
     """
     try:
-        g = fs.get(ObjectId(file_id))
+        g = await gridfs_bucket().open_download_stream(ObjectId(file_id))
     except Exception:
         raise HTTPException(status_code=404, detail="file not found")
-    stream = io.BytesIO(g.read())
-    return StreamingResponse(stream, media_type=g.content_type, headers={"Content-Disposition": f"attachment; filename={g.filename}"})
+
+    etag = _etag(g)
+    headers = {
+        "Content-Disposition": f"attachment; filename={g.filename}",
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    length = g.length
+    span = None
+    # If-Range: only honour the range if the client still has this version
+    if range and (not if_range or if_range.strip() == etag):
+        span = _parse_range(range, length)
+    if span is None:
+        headers["Content-Length"] = str(length)
+        return StreamingResponse(_iter_file(g, 0, length - 1), media_type=_content_type(g), headers=headers)
+
+    start, end = span
+    headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_iter_file(g, start, end), status_code=206, media_type=_content_type(g), headers=headers)
 
 @router.get("/", summary="List uploaded models")
-def list_models(limit: int = 50):
-    docs = list(db.models.find().sort([("_id", -1)]).limit(limit))
+async def list_models(limit: int = 50):
+    docs = await async_models_collection().find().sort([("_id", -1)]).limit(limit).to_list(length=None)
     out = []
     for d in docs:
         d["gridfs_id"] = str(d["gridfs_id"])
         d["_id"] = str(d["_id"])
         out.append(d)
     return out
+
+@router.get("/loaded", summary="List models held in memory by the registry")
+def list_loaded_models():
+    return registry.loaded()
+
+@router.get("/cache", summary="Prediction cache hit/miss counters")
+def prediction_cache_stats():
+    return cache_stats()
+
+@router.post("/reload/{name}", summary="Reload a registered model into memory")
+def reload_model(name: str):
+    if name not in registry.names():
+        raise HTTPException(status_code=404, detail=f"model '{name}' is not registered")
+    try:
+        entry = registry.reload(name)
+    except Exception as e:
+        # the previous version keeps serving
+        raise HTTPException(status_code=500, detail=f"model reload error: {e}")
+    return entry.describe()
@@ -1,52 +1,117 @@
 # models_loader.py
 import os
+from datetime import datetime, timezone
+from typing import Optional
+
 import joblib
-import tempfile
-import gridfs
 from bson import ObjectId
 from .db import db
+from . import model_cache
 from fastapi import HTTPException
 import logging
 
 LOGGER = logging.getLogger(__name__)
 
+# numpy arrays inside uncompressed joblib pickles are memory-mapped read-only,
+# so every worker maps the same page-cache pages instead of holding a copy.
+# Set MODEL_MMAP_MODE= (empty) to load into private memory.
+MMAP_MODE = os.getenv("MODEL_MMAP_MODE", "r") or None
+
+def _load(path: str):
+    return joblib.load(path, mmap_mode=MMAP_MODE)
+
 def load_from_disk(path: str):
     if not os.path.exists(path):
         return None
-    return joblib.load(path)
+    return _load(path)
 
-def load_from_gridfs_by_name(name: str):
-    """Find a models doc by name in db.models and load its GridFS bytes."""
+def latest_model_doc(name: str):
+    """Return the newest db.models doc for a model name (or None)."""
+    return db.models.find_one({"name": name}, sort=[("_id", -1)])
+
+def load_from_gridfs_doc(doc: dict):
+    """Load the GridFS artifact referenced by a db.models doc via the local model cache."""
     try:
-        doc = db.models.find_one({"name": name}, sort=[("_id", -1)])
-        if not doc:
+        path = model_cache.fetch(doc)
+        if path is None:
             return None
-        fs = gridfs.GridFS(db)
-        gridfs_id = doc.get("gridfs_id")
-        if not gridfs_id:
-            return None
-        g = fs.get(gridfs_id)
-        content = g.read()
-        # write to temp file and load
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            tmp.write(content)
-            tmp.flush()
-            return joblib.load(tmp.name)
+        return _load(path)
     except Exception as e:
         LOGGER.exception("gridfs load failed")
         raise HTTPException(status_code=500, detail=f"GridFS load error: {e}")
 
+def load_from_gridfs_by_name(name: str):
+    """Find a models doc by name in db.models and load its GridFS bytes."""
+    doc = latest_model_doc(name)
+    if not doc:
+        return None
+    return load_from_gridfs_doc(doc)
+
+def _doc_time(doc: dict) -> Optional[datetime]:
+    oid = doc.get("_id")
+    return oid.generation_time if isinstance(oid, ObjectId) else None
+
+def version_time(version: Optional[str]) -> Optional[datetime]:
+    """When a registry version was produced: the file mtime or the upload's ObjectId time."""
+    if not version:
+        return None
+    if version.startswith("disk:"):
+        return datetime.fromtimestamp(int(version[5:]), timezone.utc)
+    if ObjectId.is_valid(version):
+        return ObjectId(version).generation_time
+    return None
+
+def doc_is_newer(doc: dict, version: Optional[str]) -> bool:
+    """True if the db.models `doc` should replace the registry's `version`."""
+    if version == str(doc["_id"]):
+        return False
+    if isinstance(doc["_id"], ObjectId) and version and ObjectId.is_valid(version):
+        return doc["_id"] > ObjectId(version)  # two uploads: finer than a second
+    doc_time, current = _doc_time(doc), version_time(version)
+    if current is None or doc_time is None:
+        return True
+    return doc_time > current
+
+def load_model_with_version(name: str, local_path: str, disk_only: bool = False):
+    """
+    Load the current version of a model: the newer of the local file and
+    the latest GridFS upload (a tie goes to the file). Returns (model, version):
+      - "disk:<mtime>" for a local file
+      - the db.models _id for a GridFS artifact
+    If the GridFS lookup or load fails, the local file is used when present.
+    disk_only skips Mongo altogether. Raises RuntimeError when neither is
+    available.
+    """
+    disk_version = f"disk:{int(os.path.getmtime(local_path))}" if os.path.exists(local_path) else None
+    if disk_only:
+        if disk_version is None:
+            raise RuntimeError(f"Model '{name}' not found on disk ({local_path}); GridFS not consulted.")
+        return load_from_disk(local_path), disk_version
+    try:
+        doc = latest_model_doc(name)
+    except Exception:
+        if disk_version is None:
+            raise
+        LOGGER.exception("GridFS lookup for %s failed, loading %s", name, local_path)
+        doc = None
+    if doc is not None and doc_is_newer(doc, disk_version):
+        try:
+            mdl = load_from_gridfs_doc(doc)
+            if mdl is not None:
+                return mdl, str(doc["_id"])
+        except Exception:
+            if disk_version is None:
+                raise
+            LOGGER.exception("GridFS load of %s %s failed, loading %s", name, doc["_id"], local_path)
+    if disk_version is not None:
+        return load_from_disk(local_path), disk_version
+    raise RuntimeError(f"Model '{name}' not found on disk ({local_path}) or GridFS.")
+
 def load_model(name: str, local_path: str):
     """
-    Try to load a model pipeline:
-      1) from local_path
-      2) fallback to GridFS using db.models with field name
+    Load the current version of a model pipeline (see load_model_with_version):
+    local_path or the latest GridFS upload by db.models name, whichever is newer.
     Returns the loaded object or raises RuntimeError
     """
-    mdl = load_from_disk(local_path)
-    if mdl is not None:
-        return mdl
-    mdl = load_from_gridfs_by_name(name)
-    if mdl is not None:
-        return mdl
-    raise RuntimeError(f"Model '{name}' not found on disk ({local_path}) or GridFS.")
+    mdl, _ = load_model_with_version(name, local_path)
+    return mdl
@@ -0,0 +1,192 @@
+# mongo_standin.py
+"""
+In-memory Mongo for local runs and tests: MONGO_URI=mongomock://
+
+The sync client is mongomock; the async one is a thin awaitable facade over
+the same mongomock client, shaped like pymongo's AsyncMongoClient, so data
+written by a background thread (registry, neighbor index, offline job) is
+visible to the async routes and vice versa. AsyncGridFSBucket likewise wraps
+mongomock's patched sync bucket in the subset of gridfs.AsyncGridFSBucket the
+routes use.
+
+Needs `pip install mongomock`; it is only imported when MONGO_URI asks for it.
+"""
+import functools
+import itertools
+
+import gridfs
+import mongomock
+from mongomock.collection import BulkOperationBuilder
+from mongomock.gridfs import enable_gridfs_integration
+
+STANDIN_SCHEME = "mongomock://"
+
+
+def _without_sort(method):
+    # pymongo >= 4.11 passes sort= for ReplaceOne / UpdateOne, which mongomock's builder does not take
+    @functools.wraps(method)
+    def wrapper(self, *args, sort=None, **kwargs):
+        if sort is not None:
+            raise NotImplementedError("the in-memory stand-in does not support sort in bulk writes")
+        return method(self, *args, **kwargs)
+
+    wrapper.drops_sort = True
+    return wrapper
+
+
+def _patch_bulk_write():
+    for name in ("add_replace", "add_update"):
+        method = getattr(BulkOperationBuilder, name)
+        if not getattr(method, "drops_sort", False):
+            setattr(BulkOperationBuilder, name, _without_sort(method))
+
+
+def create_clients():
+    """(sync client, async client) sharing one in-memory store."""
+    enable_gridfs_integration()
+    _patch_bulk_write()
+    client = mongomock.MongoClient()
+    return client, AsyncClient(client)
+
+
+class _AsyncCursor:
+    """find() / aggregate() cursor: sort/skip/limit chain as usual, reads are awaitable."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        attr = getattr(self._cursor, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def chain(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            return self if result is self._cursor else result
+
+        return chain
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._cursor)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+    async def to_list(self, length=None):
+        return list(itertools.islice(self._cursor, length) if length else self._cursor)
+
+
+class _AsyncCollection:
+    """Every collection method as a coroutine; find() and aggregate() return _AsyncCursor."""
+
+    def __init__(self, collection):
+        self._collection = collection
+
+    def __getattr__(self, name):
+        attr = getattr(self._collection, name)
+        if not callable(attr):
+            return attr
+
+        @functools.wraps(attr)
+        async def call(*args, **kwargs):
+            return attr(*args, **kwargs)
+
+        return call
+
+    def find(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.find(*args, **kwargs))
+
+    async def aggregate(self, *args, **kwargs):
+        return _AsyncCursor(self._collection.aggregate(*args, **kwargs))
+
+
+class _AsyncDatabase:
+    def __init__(self, database):
+        self.delegate = database
+
+    def __getitem__(self, name):
+        return _AsyncCollection(self.delegate[name])
+
+    def get_collection(self, name, **kwargs):
+        return _AsyncCollection(self.delegate.get_collection(name, **kwargs))
+
+
+class AsyncClient:
+    """Async view of a mongomock.MongoClient, shaped like pymongo.AsyncMongoClient."""
+
+    def __init__(self, client):
+        self.delegate = client
+
+    def __getitem__(self, name):
+        return _AsyncDatabase(self.delegate[name])
+
+    def get_database(self, name=None, **kwargs):
+        return _AsyncDatabase(self.delegate.get_database(name, **kwargs))
+
+    async def close(self):
+        pass
+
+
+class _GridIn:
+    def __init__(self, grid_in):
+        self._grid_in = grid_in
+
+    @property
+    def _id(self):
+        return self._grid_in._id
+
+    async def write(self, data):
+        self._grid_in.write(data)
+
+    async def set(self, name, value):
+        setattr(self._grid_in, name, value)
+
+    async def close(self):
+        self._grid_in.close()
+
+    async def abort(self):
+        self._grid_in.abort()
+
+
+class _GridOut:
+    def __init__(self, grid_out):
+        self._grid_out = grid_out
+
+    def __getattr__(self, name):
+        return getattr(self._grid_out, name)
+
+    async def seek(self, pos, whence=0):
+        return self._grid_out.seek(pos, whence)
+
+    async def read(self, size=-1):
+        return self._grid_out.read(size)
+
+    async def readchunk(self):
+        return self._grid_out.readchunk()
+
+
+class AsyncGridFSBucket:
+    """Awaitable facade over gridfs.GridFSBucket, shaped like gridfs.AsyncGridFSBucket."""
+
+    def __init__(self, database):
+        self._bucket = gridfs.GridFSBucket(database)
+
+    def open_upload_stream(self, filename, chunk_size_bytes=None, metadata=None):
+        return _GridIn(self._bucket.open_upload_stream(
+            filename, chunk_size_bytes=chunk_size_bytes, metadata=metadata
+        ))
+
+    async def upload_from_stream(self, filename, source, chunk_size_bytes=None, metadata=None):
+        return self._bucket.upload_from_stream(
+            filename, source, chunk_size_bytes=chunk_size_bytes, metadata=metadata
+        )
+
+    async def open_download_stream(self, file_id):
+        return _GridOut(self._bucket.open_download_stream(file_id))
+
+    async def delete(self, file_id):
+        self._bucket.delete(file_id)
@@ -0,0 +1,216 @@
+# neighbor_index.py
+import os
+import threading
+import time
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .db import products_collection, neighbors_collection
+from .normalize import normalize_product
+
+LOGGER = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv("NEIGHBOR_INDEX_REFRESH", "60"))
+# Product metadata and best sellers change without the neighbors job running,
+# so the snapshot is also rebuilt once it is this many seconds old
+PRODUCTS_TTL = float(os.getenv("NEIGHBOR_INDEX_PRODUCTS_TTL", "900"))
+
+# Fields the recommender returns for each product
+PRODUCT_PROJECTION = {"_id": 1, "name": 1, "images": 1, "category": 1, "mrp": 1}
+# How many best sellers to keep for cold start / padding
+POPULAR_TOP_N = int(os.getenv("NEIGHBOR_INDEX_POPULAR", "1000"))
+
+
+class NeighborIndex:
+    """
+    Immutable in-memory snapshot of item_neighbors plus product metadata.
+
+    SKUs are interned to int32 ids; neighbor lists are stored CSR-style
+    (indptr / int32 indices / float32 scores) in the order the offline job
+    wrote them, and `products[i]` is the projected, already normalized
+    product for id i (None when the SKU has no products doc); it is shared
+    between requests and must not be mutated. A refresh builds a new
+    snapshot and swaps the module-level reference, so readers never see a
+    half-built index. `popular` holds the ids of the best sellers by
+    units_sold, descending, for cold start and padding. `built_at` is the
+    time.monotonic() at which the snapshot was built.
+    """
+
+    def __init__(self, skus: List[str], indptr, indices, scores, has_row, products, popular, computed_at):
+        self.skus = skus
+        self.sku_to_idx: Dict[str, int] = {s: i for i, s in enumerate(skus)}
+        self.indptr = indptr
+        self.indices = indices
+        self.scores = scores
+        self.has_row = has_row
+        self.products = products
+        self.popular = popular
+        self.computed_at = computed_at
+        self.built_at = time.monotonic()
+
+    def __len__(self):
+        return len(self.skus)
+
+    def neighbors(self, sku: str, k: Optional[int] = None):
+        """(neighbor ids, scores) for a SKU, or None if it has no neighbors doc."""
+        i = self.sku_to_idx.get(sku)
+        if i is None or not self.has_row[i]:
+            return None
+        start, end = self.indptr[i], self.indptr[i + 1]
+        if k is not None:
+            end = min(end, start + k)
+        return self.indices[start:end], self.scores[start:end]
+
+    def gather(self, ids: np.ndarray):
+        """
+        Concatenated neighbor lists of several rows in one vectorised step.
+        Returns (row position of each edge, neighbor ids, scores).
+        """
+        starts = self.indptr[ids]
+        lengths = self.indptr[ids + 1] - starts
+        total = int(lengths.sum())
+        owner = np.repeat(np.arange(len(ids)), lengths)
+        # position of each edge = its row's start + its offset inside the row
+        offsets = np.arange(total) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        pos = starts[owner] + offsets
+        return owner, self.indices[pos], self.scores[pos]
+
+    def describe(self) -> dict:
+        return {
+            "skus": len(self.skus),
+            "rows": int(self.has_row.sum()),
+            "edges": int(len(self.indices)),
+            "computed_at": _iso(self.computed_at),
+            "age_seconds": round(time.monotonic() - self.built_at, 1),
+        }
+
+
+def _iso(ts):
+    """computed_at as a string; other writers may have stored it as something other than a datetime."""
+    if ts is None:
+        return None
+    return ts.isoformat() if hasattr(ts, "isoformat") else str(ts)
+
+
+def latest_computed_at():
+    # one index seek on the computed_at index created in db.ensure_indexes()
+    doc = neighbors_collection().find_one(
+        {}, {"computed_at": 1}, sort=[("computed_at", -1)]
+    )
+    return doc.get("computed_at") if doc else None
+
+
+def build_index() -> NeighborIndex:
+    """Bulk-load item_neighbors and products (one cursor each) into a NeighborIndex."""
+    skus: List[str] = []
+    sku_to_idx: Dict[str, int] = {}
+
+    def intern(sku):
+        i = sku_to_idx.get(sku)
+        if i is None:
+            i = sku_to_idx[sku] = len(skus)
+            skus.append(sku)
+        return i
+
+    rows = {}
+    computed_at = None
+    for doc in neighbors_collection().find({}, {"neighbors": 1, "computed_at": 1}):
+        if "neighbors" not in doc:
+            continue
+        i = intern(doc["_id"])
+        nbrs = doc["neighbors"] or []
+        rows[i] = (
+            [intern(n["sku"]) for n in nbrs],
+            [float(n.get("score", 0.0)) for n in nbrs],
+        )
+        ts = doc.get("computed_at")
+        if ts is not None and (computed_at is None or ts > computed_at):
+            computed_at = ts
+
+    product_docs = {}
+    sold = {}
+    for doc in products_collection().find({}, {**PRODUCT_PROJECTION, "units_sold": 1}):
+        i = intern(doc["_id"])
+        units = doc.pop("units_sold", None)
+        sold[i] = float(units) if units is not None else float("-inf")
+        product_docs[i] = normalize_product(doc)
+
+    n = len(skus)
+    counts = np.zeros(n, dtype=np.int64)
+    has_row = np.zeros(n, dtype=bool)
+    for i, (idx, _) in rows.items():
+        counts[i] = len(idx)
+        has_row[i] = True
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+
+    indices = np.empty(indptr[-1], dtype=np.int32)
+    scores = np.empty(indptr[-1], dtype=np.float32)
+    for i, (idx, sc) in rows.items():
+        indices[indptr[i]:indptr[i + 1]] = idx
+        scores[indptr[i]:indptr[i + 1]] = sc
+
+    products = [product_docs.get(i) for i in range(n)]
+
+    sold_ids = np.fromiter(sold.keys(), dtype=np.int32, count=len(sold))
+    sold_units = np.fromiter(sold.values(), dtype=np.float64, count=len(sold))
+    popular = sold_ids[np.argsort(-sold_units, kind="stable")[:POPULAR_TOP_N]]
+
+    return NeighborIndex(skus, indptr, indices, scores, has_row, products, popular, computed_at)
+
+
+_index: Optional[NeighborIndex] = None
+_refresh_lock = threading.Lock()
+
+
+def get_index() -> Optional[NeighborIndex]:
+    """The current snapshot, or None if it has not been (successfully) built."""
+    return _index
+
+
+def refresh(force: bool = False) -> Optional[NeighborIndex]:
+    """
+    Rebuild the index if item_neighbors.computed_at moved, if the snapshot's
+    product metadata is older than PRODUCTS_TTL, or when forced.
+    """
+    global _index
+    with _refresh_lock:
+        if not force and _index is not None:
+            fresh = time.monotonic() - _index.built_at < PRODUCTS_TTL
+            if fresh and latest_computed_at() == _index.computed_at:
+                return _index
+        index = build_index()
+        _index = index
+        LOGGER.info("neighbor index loaded: %s", index.describe())
+        return index
+
+
+class NeighborIndexRefresher:
+    """Daemon thread that calls refresh() every `interval` seconds."""
+
+    def __init__(self, interval: float = REFRESH_INTERVAL):
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="neighbor-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                refresh()
+            except Exception:
+                LOGGER.exception("neighbor index refresh failed")
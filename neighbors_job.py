@@ -0,0 +1,209 @@
+# neighbors_job.py
+"""
+Offline item-item neighbor builder (replaces Cell 5 of MongoDBintegration.ipynb).
+
+    python -m app.neighbors_job                 # full rebuild
+    python -m app.neighbors_job --incremental   # only items touched since the last run
+
+Cosine similarity over the item x user purchase matrix, kept sparse end to
+end: rows are L2-normalised as a sparse matrix and multiplied block by block
+(`--block` items at a time), so peak memory is bounded by one block's
+similarity rows instead of an n_items x n_items dense matrix. Each block is
+reduced to its top-K neighbors before the next one is computed, and results
+are written to item_neighbors with chunked unordered bulk_write calls. Items
+left with no neighbors have their item_neighbors doc deleted, so
+/recommend/sku keeps answering 404 for them.
+
+--incremental finds new transactions by their `_id`, so it assumes those are
+ObjectIds assigned when the transaction is inserted (the driver default).
+ObjectIds from different clients are only roughly ordered by time, so each
+run looks TX_LOOKBACK seconds behind the previous high-water mark;
+recomputing an item twice is harmless. Transactions inserted with custom
+`_id`s, or by a writer whose clock lags by more than that, are only picked
+up by the next full rebuild.
+"""
+import argparse
+import logging
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import numpy as np
+from bson import ObjectId
+from pymongo import DeleteOne, ReplaceOne
+from scipy.sparse import csr_matrix, diags
+
+from .db import db, products_collection, transactions_collection, neighbors_collection
+
+LOGGER = logging.getLogger(__name__)
+
+TOPK = 50
+BLOCK_SIZE = 1024
+WRITE_CHUNK = 1000
+STATE_ID = "item_neighbors"  # _id of this job's state doc in db.jobs
+TX_LOOKBACK = float(os.getenv("NEIGHBORS_TX_LOOKBACK", "300"))
+
+
+def load_user_item(sku_to_idx: dict) -> csr_matrix:
+    """Aggregate transactions into a (n_users x n_items) float32 quantity matrix."""
+    agg = defaultdict(float)
+    cursor = transactions_collection().aggregate(
+        [{"$group": {"_id": {"user": "$user_id", "sku": "$sku"}, "qty": {"$sum": "$quantity"}}}],
+        allowDiskUse=True,
+    )
+    for d in cursor:
+        idx = sku_to_idx.get(d["_id"]["sku"])
+        if idx is not None:
+            agg[(d["_id"]["user"], idx)] += d["qty"]
+
+    user_to_idx = {}
+    rows = np.empty(len(agg), dtype=np.int64)
+    cols = np.empty(len(agg), dtype=np.int64)
+    vals = np.empty(len(agg), dtype=np.float32)
+    for n, ((u, item), q) in enumerate(agg.items()):
+        rows[n] = user_to_idx.setdefault(u, len(user_to_idx))
+        cols[n] = item
+        vals[n] = q
+    return csr_matrix((vals, (rows, cols)), shape=(len(user_to_idx), len(sku_to_idx)))
+
+
+def normalize_rows(m: csr_matrix) -> csr_matrix:
+    """L2-normalise each row of a sparse matrix (all-zero rows stay zero)."""
+    norms = np.sqrt(np.asarray(m.multiply(m).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return (diags(1.0 / norms).astype(np.float32) @ m).tocsr()
+
+
+def top_k_block(sim: csr_matrix, row_ids: np.ndarray, k: int):
+    """
+    Yield (item index, neighbor indices, scores) for each row of a sparse
+    similarity block, best first, dropping self-similarity and non-positive scores.
+    """
+    for r, item in enumerate(row_ids):
+        start, end = sim.indptr[r], sim.indptr[r + 1]
+        cols = sim.indices[start:end]
+        vals = sim.data[start:end]
+        keep = (vals > 0) & (cols != item)
+        cols, vals = cols[keep], vals[keep]
+        if len(vals) > k:
+            part = np.argpartition(-vals, k - 1)[:k]
+            cols, vals = cols[part], vals[part]
+        order = np.argsort(-vals, kind="stable")
+        yield item, cols[order], vals[order]
+
+
+def compute_neighbors(item_norm: csr_matrix, rows: np.ndarray, k: int = TOPK, block: int = BLOCK_SIZE):
+    """Top-k cosine neighbors for `rows`, one sparse block product at a time."""
+    item_norm_t = item_norm.T.tocsr()
+    for start in range(0, len(rows), block):
+        ids = rows[start:start + block]
+        sim = (item_norm[ids] @ item_norm_t).tocsr()
+        yield from top_k_block(sim, ids, k)
+
+
+def write_neighbors(results, sku_list, chunk: int = WRITE_CHUNK):
+    """
+    Replace item_neighbors docs in chunked unordered bulk writes, deleting the
+    docs of items that have no neighbors. Returns (docs written, items without
+    neighbors).
+    """
+    col = neighbors_collection()
+    computed_at = datetime.utcnow()
+    ops, written, deleted = [], 0, 0
+
+    def flush():
+        col.bulk_write(ops, ordered=False)
+        ops.clear()
+
+    for item, cols, vals in results:
+        sku = sku_list[item]
+        if len(cols) == 0:
+            ops.append(DeleteOne({"_id": sku}))
+            deleted += 1
+        else:
+            neighs = [{"sku": sku_list[j], "score": float(s)} for j, s in zip(cols.tolist(), vals.tolist())]
+            ops.append(ReplaceOne(
+                {"_id": sku},
+                {"_id": sku, "neighbors": neighs, "computed_at": computed_at},
+                upsert=True,
+            ))
+            written += 1
+        if len(ops) >= chunk:
+            flush()
+    if ops:
+        flush()
+    return written, deleted
+
+
+def since_query(last_tx_id, lookback: float = TX_LOOKBACK) -> dict:
+    """_id filter for transactions inserted after the previous run (see the module docstring)."""
+    if isinstance(last_tx_id, ObjectId) and lookback > 0:
+        start = last_tx_id.generation_time - timedelta(seconds=lookback)
+        return {"$gt": ObjectId.from_datetime(start)}
+    return {"$gt": last_tx_id}
+
+
+def affected_items(user_item: csr_matrix, touched: np.ndarray) -> np.ndarray:
+    """
+    Items whose neighbor lists can change when `touched` items get new purchases:
+    the touched items themselves plus every item sharing a buyer with one of them
+    (sim(i, t) is only non-zero for those). Everything else is unchanged.
+    """
+    if len(touched) == 0:
+        return touched
+    buyers = np.unique(user_item[:, touched].tocoo().row)
+    co_bought = user_item[buyers].indices
+    return np.union1d(touched, co_bought).astype(np.int64)
+
+
+def run(incremental: bool = False, k: int = TOPK, block: int = BLOCK_SIZE, chunk: int = WRITE_CHUNK) -> dict:
+    state = db.jobs.find_one({"_id": STATE_ID}) if incremental else None
+    # transactions inserted after this point are picked up by the next run
+    newest = transactions_collection().find_one({}, {"_id": 1}, sort=[("_id", -1)])
+    high_water = newest["_id"] if newest else None
+
+    sku_list = [p["_id"] for p in products_collection().find({}, {"_id": 1})]
+    sku_to_idx = {s: i for i, s in enumerate(sku_list)}
+    user_item = load_user_item(sku_to_idx)
+    item_norm = normalize_rows(user_item.T.tocsr())
+    LOGGER.info("user_item shape %s, nnz %d", user_item.shape, user_item.nnz)
+
+    if state and state.get("last_tx_id") is not None:
+        query = {"_id": since_query(state["last_tx_id"])}
+        if high_water is not None:
+            query["_id"]["$lte"] = high_water
+        touched_skus = transactions_collection().distinct("sku", query)
+        touched = np.array(sorted(sku_to_idx[s] for s in touched_skus if s in sku_to_idx), dtype=np.int64)
+        rows = affected_items(user_item, touched)
+        mode = "incremental"
+    else:
+        rows = np.arange(len(sku_list), dtype=np.int64)
+        mode = "full"
+    LOGGER.info("%s run: recomputing %d of %d items", mode, len(rows), len(sku_list))
+
+    written, deleted = write_neighbors(compute_neighbors(item_norm, rows, k, block), sku_list, chunk)
+
+    db.jobs.replace_one(
+        {"_id": STATE_ID},
+        {"_id": STATE_ID, "last_tx_id": high_water, "mode": mode, "items": written, "finished_at": datetime.utcnow()},
+        upsert=True,
+    )
+    return {"mode": mode, "items": len(sku_list), "recomputed": written, "deleted": deleted}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build item-item neighbors into item_neighbors")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only recompute items affected by transactions since the last run")
+    parser.add_argument("--topk", type=int, default=TOPK, help="neighbors kept per item")
+    parser.add_argument("--block", type=int, default=BLOCK_SIZE,
+                        help="items per sparse similarity block (bounds memory)")
+    parser.add_argument("--chunk", type=int, default=WRITE_CHUNK, help="docs per bulk_write")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    print(run(incremental=args.incremental, k=args.topk, block=args.block, chunk=args.chunk))
+
+
+if __name__ == "__main__":
+    main()
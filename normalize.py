@@ -0,0 +1,72 @@
+# normalize.py
+from typing import Iterable, List, Optional
+
+# Fallback order for the UI-safe product name
+NAME_FIELDS = ("name", "product_name", "title")
+
+
+def normalize_product(doc: dict) -> dict:
+    """
+    Ensures every product has:
+    - sku (moved from _id)
+    - display_name (UI-safe)
+
+    Works in place and returns the same dict: pymongo hands out a fresh dict
+    per document, so copying it again only costs allocations. Pass a copy if
+    the dict is shared (e.g. cached).
+    """
+    sku = doc.pop("_id")
+    doc["sku"] = sku
+    doc["display_name"] = (
+        doc.get("name")
+        or doc.get("product_name")
+        or doc.get("title")
+        or str(sku)
+    )
+    return doc
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """'sku, display_name,category' -> ['sku', 'display_name', 'category']; None/'' -> None (all fields)."""
+    if not fields:
+        return None
+    wanted = [f.strip() for f in fields.split(",") if f.strip()]
+    return wanted or None
+
+
+def product_projection(wanted: Optional[List[str]], extra: Iterable[str] = ()) -> Optional[dict]:
+    """
+    Mongo projection for the requested output fields. `sku` comes from _id and
+    `display_name` needs the name fallbacks; `extra` adds fields the caller
+    needs internally (they are dropped again by select_fields).
+    """
+    if wanted is None:
+        return None
+    proj = {"_id": 1}
+    for f in wanted:
+        if f == "display_name":
+            proj.update({n: 1 for n in NAME_FIELDS})
+        elif f != "sku":
+            proj[f] = 1
+    for f in extra:
+        proj[f] = 1
+    return proj
+
+
+def select_fields(doc: dict, wanted: Optional[List[str]]) -> dict:
+    """Drop (in place) anything that was fetched only to derive or page."""
+    if wanted is not None:
+        for k in [k for k in doc if k not in wanted]:
+            del doc[k]
+    return doc
+
+
+def to_columnar(items: List[dict], wanted: Optional[List[str]]) -> dict:
+    """Rows -> {"fields": [...], "columns": {field: [values...]}} for bulk consumers."""
+    if wanted is None:
+        wanted = list(dict.fromkeys(k for item in items for k in item))
+    return {
+        "count": len(items),
+        "fields": wanted,
+        "columns": {f: [item.get(f) for item in items] for f in wanted},
+    }
@@ -0,0 +1,117 @@
+# prediction_cache.py
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from .model_registry import registry
+
+CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "300"))
+# Numeric inputs are rounded to this many decimals before keying; the
+# Streamlit sliders send at most two, so 6 only merges float noise.
+CACHE_DECIMALS = int(os.getenv("PREDICTION_CACHE_DECIMALS", "6"))
+
+MISS = object()
+
+
+def quantize(value) -> float:
+    """Canonical numeric key part: 90, 90.0 and 90.0000001 map to the same key."""
+    return round(float(value), CACHE_DECIMALS)
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL memo of prediction responses.
+
+    Keys are built by the routers from canonicalised inputs plus the model
+    version(s) that produced the answer. The cache is also cleared whenever
+    the registry swaps one of `models`, so stale entries do not linger until
+    they expire or are evicted.
+    """
+
+    def __init__(self, name: str, models: Iterable[str], maxsize: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.name = name
+        self.models = set(models)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] < now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return MISS
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def peek(self, key: tuple):
+        """Like get(), but leaves hits, misses and LRU order alone."""
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or item[1] < time.monotonic():
+            return MISS
+        return item[0]
+
+    def put(self, key: tuple, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.invalidations += 1
+
+    def on_model_swap(self, name: str):
+        if name in self.models:
+            self.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+_caches: Dict[str, PredictionCache] = {}
+
+
+def create_cache(name: str, models: Iterable[str]) -> PredictionCache:
+    """Create a named cache that is invalidated when any of `models` is swapped."""
+    cache = PredictionCache(name, models)
+    _caches[name] = cache
+    registry.subscribe(cache.on_model_swap)
+    return cache
+
+
+def get_cache(name: str) -> Optional[PredictionCache]:
+    return _caches.get(name)
+
+
+def cache_stats():
+    return [c.stats() for c in _caches.values()]
@@ -1,12 +1,23 @@
 # price.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Response
 from pydantic import BaseModel
-from typing import Any, Dict
+from typing import Any, Dict, List
 import os, joblib, numpy as np, pandas as pd
-from ..models_loader import load_model   # uses disk or gridfs fallback
+from ..model_registry import registry   # warm artifacts (disk or gridfs fallback)
+from ..prediction_cache import create_cache, quantize, MISS
+from ..metrics import span
+from ..inference import executor, XGB_NTHREAD
 
 router = APIRouter(prefix="/price", tags=["price"])
 
+MODEL_NAME = "price_pipeline"
+
+BATCH_MAX_ROWS = int(os.getenv("PRICE_BATCH_MAX_ROWS", "100000"))
+
+# NOTE: num_cols and cat_cols must match what was used in the training script
+NUM_COLS = ["log_mrp", "units_sold", "mrp"]
+CAT_COLS = ["category", "state"]
+
 class PriceRequest(BaseModel):
     mrp: float
     month: int
@@ -14,20 +25,223 @@ class PriceRequest(BaseModel):
     category: str
     state: str
 
+# Either a list of rows or one list per column (all the same length)
+class PriceBatchRequest(BaseModel):
+    rows: List[PriceRequest] | None = None
+    mrp: List[float] | None = None
+    month: List[int] | None = None
+    units_sold: List[float] | None = None
+    category: List[str] | None = None
+    state: List[str] | None = None
+
+def _smoke_price(artifact):
+    """
+    Reject artifacts that cannot price a known category/state pair.
+    Runs on every version before it is installed, so the booster's nthread
+    is set here whether or not CompiledPriceModel can be built.
+    """
+    # the inference executor's worker count is what bounds parallelism
+    artifact["xgb_model"].set_param({"nthread": XGB_NTHREAD})
+    enc = artifact["encoder"]
+    sample = PriceRequest(
+        mrp=100.0,
+        month=6,
+        units_sold=100.0,
+        category=str(enc.categories_[0][0]),
+        state=str(enc.categories_[1][0]),
+    )
+    predicted = predict_with_artifact(artifact, sample)
+    if not np.isfinite(predicted):
+        raise ValueError(f"smoke prediction is not finite: {predicted}")
+
+def _imputer_medians(num_imp) -> Dict[str, float]:
+    """The imputer's fill values per NUM_COLS column; raises ValueError if it does more than fill NaNs."""
+    if getattr(num_imp, "add_indicator", False):
+        raise ValueError("imputer add_indicator is not supported")
+    missing = getattr(num_imp, "missing_values", np.nan)
+    if not (isinstance(missing, float) and np.isnan(missing)):
+        raise ValueError(f"imputer missing_values={missing!r} is not supported")
+    names = list(getattr(num_imp, "feature_names_in_", NUM_COLS))
+    if names != NUM_COLS:
+        raise ValueError(f"imputer was fit on {names}, expected {NUM_COLS}")
+    return {c: float(v) for c, v in zip(NUM_COLS, num_imp.statistics_)}
+
+def _unknown_code(enc):
+    """Code the encoder gives unseen categories, or None if it rejects them."""
+    if getattr(enc, "handle_unknown", "error") == "use_encoded_value":
+        return float(enc.unknown_value)
+    return None
+
+class CompiledPriceModel:
+    """
+    Single-row fast path built once per artifact version.
+
+    The imputer medians, ordinal-encoder categories and feature order are read
+    out of the artifact up front, so a request becomes a few dict lookups and
+    a contiguous float32 row fed to Booster.inplace_predict - no DataFrame,
+    no DMatrix. The constructor checks the result against the pandas path
+    (predict_with_artifact) on a grid of inputs and raises on any difference,
+    in which case the registry keeps serving the pandas path.
+    """
+
+    def __init__(self, artifact: Dict[str, Any]):
+        self.bst = artifact["xgb_model"]
+        num_imp = artifact["num_imputer"]
+        enc = artifact["encoder"]
+        self.features = list(artifact["features"])
+
+        self.medians = _imputer_medians(num_imp)
+        # category -> ordinal code, as OrdinalEncoder.transform would return it
+        self.codes = {
+            c: {str(v): float(i) for i, v in enumerate(cats)}
+            for c, cats in zip(CAT_COLS, enc.categories_)
+        }
+        self.unknown = _unknown_code(enc)
+
+        supported = set(NUM_COLS) | set(CAT_COLS) | {"month", "month_sin", "month_cos"}
+        unsupported = [f for f in self.features if f not in supported]
+        if unsupported:
+            raise ValueError(f"unsupported features: {unsupported}")
+
+        # same expression as the pandas path, evaluated once for the 12 months
+        months = np.arange(1, 13)
+        self.month_sin = dict(zip(months.tolist(), np.sin(2 * np.pi * months / 12).tolist()))
+        self.month_cos = dict(zip(months.tolist(), np.cos(2 * np.pi * months / 12).tolist()))
+
+        self._predict = self._predict_inplace
+        if not self._matches_reference(artifact):
+            self._predict = self._predict_dmatrix
+            if not self._matches_reference(artifact):
+                raise ValueError("compiled price path differs from the pandas path")
+
+    def row(self, req: PriceRequest) -> np.ndarray:
+        """Encode one request as a (1, n_features) contiguous float32 row."""
+        values = {
+            "mrp": req.mrp,
+            "units_sold": req.units_sold,
+            "log_mrp": float(np.log1p(req.mrp)),
+            "month": float(req.month),
+        }
+        for c in NUM_COLS:
+            if values[c] != values[c]:  # NaN -> training median
+                values[c] = self.medians[c]
+        for c in CAT_COLS:
+            code = self.codes[c].get(str(getattr(req, c)), self.unknown)
+            if code is None:
+                raise HTTPException(
+                    status_code=500,
+                    detail=f"categorical encoding error: unknown {c} {getattr(req, c)!r}"
+                )
+            values[c] = code
+        if "month_sin" in self.features:
+            values["month_sin"] = self.month_sin.get(req.month)
+            values["month_cos"] = self.month_cos.get(req.month)
+            if values["month_sin"] is None:
+                values["month_sin"] = float(np.sin(2 * np.pi * req.month / 12))
+                values["month_cos"] = float(np.cos(2 * np.pi * req.month / 12))
+
+        return np.array([[values[f] for f in self.features]], dtype=np.float32)
+
+    def predict(self, req: PriceRequest) -> float:
+        with span("feature_engineering"):
+            X = self.row(req)
+        return self._predict(X)
+
+    def _predict_inplace(self, X: np.ndarray) -> float:
+        with span("predict"):
+            return float(self.bst.inplace_predict(X)[0])
+
+    def _predict_dmatrix(self, X: np.ndarray) -> float:
+        import xgboost as xgb
+        with span("dmatrix_build"):
+            dmat = xgb.DMatrix(X)
+        with span("predict"):
+            return float(self.bst.predict(dmat)[0])
+
+    def _matches_reference(self, artifact: Dict[str, Any]) -> bool:
+        categories = list(self.codes["category"]) + ["__unseen__"]
+        states = list(self.codes["state"])
+        for i, (month, mrp, units) in enumerate(
+            [(m, p, u) for m in range(1, 13) for p, u in [(12.5, 0.0), (449.325, 137.0), (3999.0, 2500.0)]]
+        ):
+            req = PriceRequest(
+                mrp=mrp,
+                month=month,
+                units_sold=units,
+                category=categories[i % len(categories)],
+                state=states[i % len(states)],
+            )
+            if self.predict(req) != predict_with_artifact(artifact, req):
+                return False
+        return True
+
+registry.register(
+    MODEL_NAME,
+    os.getenv("PRICE_MODEL_PATH", "app/models/price_xgb_pipeline.pkl"),
+    smoke=_smoke_price,
+    compiler=CompiledPriceModel,
+)
+
+cache = create_cache("price", [MODEL_NAME])
+
+def _cache_key(version: str, req: PriceRequest) -> tuple:
+    return (
+        version,
+        quantize(req.mrp),
+        req.month,
+        quantize(req.units_sold),
+        req.category,
+        req.state,
+    )
+
 @router.post("/predict")
-def price_predict(req: PriceRequest):
+async def price_predict(req: PriceRequest):
     """
-    Loads the saved price_xgb_pipeline.pkl artifact (a dict with
+    Uses the warm price_xgb_pipeline.pkl artifact from the model registry (a dict with
     keys: 'xgb_model', 'num_imputer', 'encoder', 'features') and returns predicted price.
+
+    Cache hits are answered here; the model runs on the inference executor.
     """
-    MODEL_NAME = "price_pipeline"
-    MODEL_PATH = os.getenv("PRICE_MODEL_PATH", "app/models/price_xgb_pipeline.pkl")
+    version = registry.version(MODEL_NAME)
+    key = None
+    if version is not None:
+        key = _cache_key(version, req)
+        cached = cache.get(key)
+        if cached is not MISS:
+            return cached
+    return await executor.run(_price_predict, req, key)
 
+def _price_predict(req: PriceRequest, looked_up=None):
+    """`looked_up` is the key the route already counted a miss for, if any."""
     try:
-        artifact = load_model(MODEL_NAME, MODEL_PATH)
+        entry = registry.get(MODEL_NAME)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"model load error: {e}")
 
+    key = _cache_key(entry.version, req)
+    # another request may have filled it while this one queued
+    cached = cache.peek(key) if key == looked_up else cache.get(key)
+    if cached is not MISS:
+        return cached
+
+    if entry.compiled is not None:
+        try:
+            result = {"predicted_price": entry.compiled.predict(req)}
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"prediction error: {e}")
+    else:
+        result = {"predicted_price": predict_with_artifact(entry.model, req)}
+
+    cache.put(key, result)
+    return result
+
+def predict_with_artifact(artifact: Dict[str, Any], req: PriceRequest) -> float:
+    """
+    Apply the training-time feature engineering to one request and run the booster.
+    Raises HTTPException(500) describing the failing stage.
+    """
     # artifact expected to be a dict saved by your Colab script
     if not isinstance(artifact, dict):
         raise HTTPException(status_code=500, detail="loaded artifact is not a dict")
@@ -40,79 +254,208 @@ def price_predict(req: PriceRequest):
     if xgb_model is None or num_imp is None or enc is None or features is None:
         raise HTTPException(status_code=500, detail="model artifact missing required pieces")
 
-    # Build DataFrame and apply same preprocessing used in training
-    sample = {
-        "mrp": req.mrp,
-        "month": req.month,
-        "units_sold": req.units_sold,
-        "category": req.category,
-        "state": req.state
-    }
-    s = pd.DataFrame([sample])
+    with span("feature_engineering"):
+        # Build DataFrame and apply same preprocessing used in training
+        sample = {
+            "mrp": req.mrp,
+            "month": req.month,
+            "units_sold": req.units_sold,
+            "category": req.category,
+            "state": req.state
+        }
+        s = pd.DataFrame([sample])
 
-    # replicate feature engineering done in Colab
-    # NOTE: num_cols and cat_cols must match what you used in training script
-    num_cols = ["log_mrp", "units_sold", "mrp"]
-    cat_cols = ["category", "state"]
+        # replicate feature engineering done in Colab
+        num_cols = NUM_COLS
+        cat_cols = CAT_COLS
 
-    # create derived features
-    s["log_mrp"] = np.log1p(s["mrp"])
-    s["month_sin"] = np.sin(2 * np.pi * s["month"] / 12)
-    s["month_cos"] = np.cos(2 * np.pi * s["month"] / 12)
+        # create derived features
+        s["log_mrp"] = np.log1p(s["mrp"])
+        s["month_sin"] = np.sin(2 * np.pi * s["month"] / 12)
+        s["month_cos"] = np.cos(2 * np.pi * s["month"] / 12)
 
-    # Impute numeric (num_imp was fit on training data)
-    try:
-        s[num_cols] = num_imp.transform(s[num_cols])
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"numeric imputation error: {e}")
+        # Impute numeric (num_imp was fit on training data)
+        try:
+            s[num_cols] = num_imp.transform(s[num_cols])
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"numeric imputation error: {e}")
 
-    # Encode categorical (encoder was fit on training)
-    try:
-        s[cat_cols] = enc.transform(s[cat_cols].astype(str))
-    except Exception as e:
-        # If encoding fails because of unseen categories, handle gracefully:
-        # OrdinalEncoder with unknown_value was used; but still catch errors.
-        raise HTTPException(status_code=500, detail=f"categorical encoding error: {e}")
+        # Encode categorical (encoder was fit on training)
+        try:
+            s[cat_cols] = enc.transform(s[cat_cols].astype(str))
+        except Exception as e:
+            # If encoding fails because of unseen categories, handle gracefully:
+            # OrdinalEncoder with unknown_value was used; but still catch errors.
+            raise HTTPException(status_code=500, detail=f"categorical encoding error: {e}")
 
-    # Select features in the correct order expected by the model
-    try:
-        X = s[features].values  # features list was saved in artifact
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"feature selection error: {e}")
+        # Select features in the correct order expected by the model
+        try:
+            X = s[features].values  # features list was saved in artifact
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"feature selection error: {e}")
 
     # predict with XGBoost object (bst)
     try:
         import xgboost as xgb
-        dmat = xgb.DMatrix(X)
-        pred = xgb.Booster()
-        # if artifact.xgb_model is an xgb.Booster object already, use it; else it's the returned object
+        with span("dmatrix_build"):
+            dmat = xgb.DMatrix(X)
         # Your script saved bst (xgb.Booster) under 'xgb_model'
         bst = xgb_model
         # If bst has a predict method expecting DMatrix:
-        y_hat = bst.predict(dmat)
+        with span("predict"):
+            y_hat = bst.predict(dmat)
         predicted = float(y_hat[0])
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"prediction error: {e}")
 
-    return {"predicted_price": predicted}
-@router.get("/categories")
-def get_price_categories():
-    MODEL_NAME = "price_pipeline"
-    MODEL_PATH = os.getenv("PRICE_MODEL_PATH", "app/models/price_xgb_pipeline.pkl")
+    return predicted
 
-    artifact = load_model(MODEL_NAME, MODEL_PATH)
-    encoder = artifact["encoder"]
+def _batch_columns(req: PriceBatchRequest) -> Dict[str, np.ndarray]:
+    """Normalise a row or columnar batch payload into one array per input column."""
+    names = ["mrp", "month", "units_sold", "category", "state"]
+    columnar = [getattr(req, n) for n in names]
+    if req.rows is not None:
+        if any(c is not None for c in columnar):
+            raise HTTPException(status_code=400, detail="send either rows or columns, not both")
+        columnar = [[getattr(r, n) for r in req.rows] for n in names]
+    elif any(c is None for c in columnar):
+        missing = [n for n, c in zip(names, columnar) if c is None]
+        raise HTTPException(status_code=400, detail=f"missing columns: {missing}")
+
+    lengths = {len(c) for c in columnar}
+    if len(lengths) != 1:
+        raise HTTPException(status_code=400, detail="all columns must have the same length")
+    if lengths.pop() > BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"batch too large (max {BATCH_MAX_ROWS} rows)")
+
+    return {
+        "mrp": np.asarray(columnar[0], dtype=np.float64),
+        "month": np.asarray(columnar[1], dtype=np.int64),
+        "units_sold": np.asarray(columnar[2], dtype=np.float64),
+        "category": np.asarray(columnar[3], dtype=object),
+        "state": np.asarray(columnar[4], dtype=object),
+    }
+
+def _encode_column(categories, values: np.ndarray, unknown):
+    """
+    OrdinalEncoder.transform for one column with array operations: the code
+    of each value is its position in `categories` (found by a binary search
+    over the sorted categories). Returns (codes, unknown mask); unknown values
+    get `unknown`, or NaN when the encoder has no code for them.
+    """
+    cats = np.asarray(categories).astype(str)
+    order = np.argsort(cats, kind="stable")
+    ranked = cats[order]
+    values = values.astype(str)
+    pos = np.minimum(np.searchsorted(ranked, values), len(ranked) - 1)
+    found = ranked[pos] == values
+    codes = np.where(found, order[pos], np.nan if unknown is None else unknown).astype(np.float64)
+    return codes, ~found
+
+def batch_features(artifact: Dict[str, Any], cols: Dict[str, np.ndarray]):
+    """
+    Vectorised version of the feature engineering in predict_with_artifact,
+    using the imputer's statistics_ and the encoder's categories_ directly.
+    Returns (X, errors): an (n_rows, n_features) float64 matrix in
+    artifact['features'] order and {row index: message} for rows the
+    encoder cannot take (unknown category without an unknown_value).
+    """
+    medians = _imputer_medians(artifact["num_imputer"])
+    enc = artifact["encoder"]
+    unknown = _unknown_code(enc)
+
+    out = {
+        "mrp": cols["mrp"],
+        "month": cols["month"].astype(np.float64),
+        "units_sold": cols["units_sold"],
+        "log_mrp": np.log1p(cols["mrp"]),
+        "month_sin": np.sin(2 * np.pi * cols["month"] / 12),
+        "month_cos": np.cos(2 * np.pi * cols["month"] / 12),
+    }
+    for c in NUM_COLS:
+        out[c] = np.where(np.isnan(out[c]), medians[c], out[c])
+
+    errors: Dict[int, str] = {}
+    for c, categories in zip(CAT_COLS, enc.categories_):
+        out[c], unseen = _encode_column(categories, cols[c], unknown)
+        if unknown is None:
+            for i in np.flatnonzero(unseen).tolist():
+                msg = f"unknown {c} {str(cols[c][i])!r}"
+                errors[i] = f"{errors[i]}; {msg}" if i in errors else msg
+
+    return np.column_stack([out[f] for f in artifact["features"]]), errors
+
+@router.post("/predict/batch")
+async def price_predict_batch(req: PriceBatchRequest):
+    """
+    Predict many (mrp, month, units_sold, category, state) rows with a single
+    DMatrix, e.g. a sweep over every category x state x month.
+    """
+    # malformed or oversized payloads are refused before taking an inference slot
+    cols = _batch_columns(req)
+    if len(cols["mrp"]) == 0:
+        return {"predicted_prices": [], "errors": []}
+    return await executor.run(_price_predict_batch, cols)
+
+def _price_predict_batch(cols: Dict[str, np.ndarray]):
+    """
+    {"predicted_prices": [...], "errors": [{"index", "error"}]}; rows listed
+    in errors (unknown category or state) have a null price.
+    """
+    try:
+        artifact = registry.get(MODEL_NAME).model
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"model load error: {e}")
+
+    try:
+        with span("feature_engineering"):
+            X, errors = batch_features(artifact, cols)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"feature engineering error: {e}")
+
+    prices = [None] * len(X)
+    valid = np.setdiff1d(np.arange(len(X)), np.fromiter(errors, dtype=np.int64, count=len(errors)))
+    if len(valid):
+        try:
+            import xgboost as xgb
+            with span("dmatrix_build"):
+                dmat = xgb.DMatrix(X[valid])
+            with span("predict"):
+                y_hat = artifact["xgb_model"].predict(dmat)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"prediction error: {e}")
+        for i, y in zip(valid.tolist(), y_hat.tolist()):
+            prices[i] = y
+
+    return {
+        "predicted_prices": prices,
+        "errors": [{"index": i, "error": errors[i]} for i in sorted(errors)],
+    }
+
+def _metadata_etag(entry) -> str:
+    """Option lists only change with the model, so its version is their ETag."""
+    return f'"{entry.name}:{entry.version}"'
+
+@router.get("/categories")
+def get_price_categories(response: Response, if_none_match: str | None = Header(None)):
+    entry = registry.get(MODEL_NAME)
+    etag = _metadata_etag(entry)
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    encoder = entry.model["encoder"]
 
     categories = encoder.categories_[0].tolist()
     return {"categories": categories}
 
 @router.get("/states")
-def get_price_states():
-    MODEL_NAME = "price_pipeline"
-    MODEL_PATH = os.getenv("PRICE_MODEL_PATH", "app/models/price_xgb_pipeline.pkl")
-
-    artifact = load_model(MODEL_NAME, MODEL_PATH)
-    encoder = artifact["encoder"]
+def get_price_states(response: Response, if_none_match: str | None = Header(None)):
+    entry = registry.get(MODEL_NAME)
+    etag = _metadata_etag(entry)
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    encoder = entry.model["encoder"]
 
     # second categorical column = state
     states = encoder.categories_[1].tolist()
@@ -1,55 +1,168 @@
 # products.py
-from fastapi import APIRouter, HTTPException
-from ..db import products_collection
+from fastapi import APIRouter, HTTPException, Query, Response
+from ..db import async_products_collection
+from ..normalize import normalize_product, parse_fields, product_projection, select_fields, to_columnar
+from ..search_index import get_index as get_search_index, tokenize, SEARCH_FIELDS, PRODUCT_PROJECTION as SEARCH_PROJECTION
 from typing import List
+import base64, json, re
 
 router = APIRouter(prefix="/products", tags=["products"])
 
 
-def normalize_product(doc: dict) -> dict:
+# Listing order; backed by the compound index created in db.ensure_indexes()
+LIST_SORT = [("units_sold", -1), ("_id", 1)]
+
+
+def encode_cursor(doc: dict) -> str:
+    """Opaque continuation token for the last (units_sold, _id) seen."""
+    raw = json.dumps([doc.get("units_sold"), doc["_id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> dict:
+    """Turn a continuation token into the Mongo filter for the next page."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        units_sold, last_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    if units_sold is None:
+        # docs without units_sold sort last; only the _id tie-break is left
+        return {"units_sold": None, "_id": {"$gt": last_id}}
+    return {"$or": [
+        {"units_sold": {"$lt": units_sold}},
+        {"units_sold": units_sold, "_id": {"$gt": last_id}},
+        # $lt never matches null/missing, which sort after every number
+        {"units_sold": None},
+    ]}
+
+
+# Shared query parameters for projection / response layout
+FIELDS_QUERY = Query(None, description="Comma-separated output fields, e.g. sku,display_name,category")
+FORMAT_QUERY = Query("rows", pattern="^(rows|columnar)$", description="rows (list of objects) or columnar (arrays per field)")
+
+
+@router.get("/", summary="List products")
+async def list_products(
+    response: Response,
+    limit: int = 50,
+    skip: int = 0,
+    cursor: str | None = None,
+    fields: str | None = FIELDS_QUERY,
+    format: str = FORMAT_QUERY,
+):
     """
-    Ensures every product has:
-    - sku
-    - display_name (UI-safe)
+    Products by units_sold (desc).
+
+    Without `cursor` this is the legacy skip/limit list. Pass `cursor=` (empty)
+    for the first page and then the returned `next_cursor` to walk pages with
+    keyset pagination, which stays fast at any depth; `skip` is ignored then.
+    `fields` is pushed down as a Mongo projection.
     """
-    out = {k: v for k, v in doc.items() if k != "_id"}
-    out["sku"] = doc["_id"]
+    wanted = parse_fields(fields)
+    projection = product_projection(wanted, extra=("units_sold",))
+    col = async_products_collection()
+    if cursor is None:
+        docs = await col.find({}, projection).sort(LIST_SORT).skip(skip).limit(limit).to_list(length=None)
+    else:
+        query = decode_cursor(cursor) if cursor else {}
+        docs = await col.find(query, projection).sort(LIST_SORT).limit(limit).to_list(length=None)
 
-    # Guaranteed display name for frontend
-    out["display_name"] = (
-        out.get("name")
-        or out.get("product_name")
-        or out.get("title")
-        or str(out["sku"])
-    )
+    next_cursor = encode_cursor(docs[-1]) if limit > 0 and len(docs) == limit else None
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
-    return out
+    items = [select_fields(normalize_product(doc), wanted) for doc in docs]
+    if format == "columnar":
+        out = to_columnar(items, wanted)
+        if cursor is not None:
+            out["next_cursor"] = next_cursor
+        return out
+    if cursor is None:
+        return items
+    return {"items": items, "next_cursor": next_cursor}
 
 
-@router.get("/", summary="List products")
-def list_products(limit: int = 50, skip: int = 0):
-    col = products_collection()
-    cursor = col.find().sort("units_sold", -1).skip(skip).limit(limit)
+def _term_filter(term: str, mode: str) -> dict:
+    """Mongo filter for one search term, mirroring the index's token semantics."""
+    rx = re.escape(term)
+    if mode == "prefix":
+        rx = rf"(^|[^0-9a-z]){rx}"
+    elif mode == "token":
+        rx = rf"(^|[^0-9a-z]){rx}([^0-9a-z]|$)"
+    return {"$or": [{f: {"$regex": rx, "$options": "i"}} for f in SEARCH_FIELDS]}
+
+
+async def _search_mongo(q: str, category: str | None, mode: str, limit: int, offset: int, projection) -> dict:
+    """Fallback while the search index is not built: regex scan plus a $group for facets."""
+    terms = list(dict.fromkeys(tokenize(q)))
+    query = {"$and": [_term_filter(t, mode) for t in terms]} if terms else {}
+    col = async_products_collection()
+    cursor = await col.aggregate([
+        {"$match": query},
+        {"$group": {"_id": "$category", "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+    ])
+    grouped = await cursor.to_list(length=None)
+    facets = [{"value": g["_id"], "count": g["count"]} for g in grouped if g["_id"]]
+    if category:
+        cat = {"category": {"$regex": f"^{re.escape(category.strip())}$", "$options": "i"}}
+        query = {"$and": [query, cat]} if query else cat
+    total = await col.count_documents(query)
+    docs = await col.find(query, projection).sort(LIST_SORT).skip(offset).limit(limit).to_list(length=None)
+    return {"total": total, "items": [normalize_product(d) for d in docs], "facets": {"category": facets}}
 
-    return [normalize_product(doc) for doc in cursor]
+
+@router.get("/search", summary="Search products by name and category")
+async def search_products(
+    q: str = "",
+    category: str | None = None,
+    mode: str = Query("prefix", pattern="^(prefix|substring|token)$"),
+    limit: int = Query(50, ge=0, le=500),
+    offset: int = Query(0, ge=0),
+    fields: str | None = FIELDS_QUERY,
+):
+    """
+    Products whose name / product_name / title / category contain every
+    word of `q` (as a word prefix by default; `mode=substring` matches
+    anywhere in a word, `mode=token` whole words only), in listing order.
+    `category` filters exactly (case-insensitive); `facets.category` counts
+    the text matches per category before that filter. Served from the
+    in-memory search index; Mongo is only used until it is built.
+    """
+    wanted = parse_fields(fields)
+    index = get_search_index()
+    if index is not None:
+        out = index.search(q, category, mode, limit, offset)
+        # index products are shared; select_fields works on a copy
+        out["items"] = [select_fields(dict(p), wanted) for p in out["items"]]
+    else:
+        projection = product_projection(wanted) or {k: 1 for k in SEARCH_PROJECTION if k != "units_sold"}
+        out = await _search_mongo(q, category, mode, limit, offset, projection)
+        out["items"] = [select_fields(p, wanted) for p in out["items"]]
+    return {"q": q, "category": category, "mode": mode, "limit": limit, "offset": offset, **out}
 
 
 @router.get("/{sku}", summary="Get product by SKU")
-def get_product(sku: str):
-    doc = products_collection().find_one({"_id": sku})
+async def get_product(sku: str, fields: str | None = FIELDS_QUERY):
+    wanted = parse_fields(fields)
+    doc = await async_products_collection().find_one({"_id": sku}, product_projection(wanted))
     if not doc:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    return normalize_product(doc)
+    return select_fields(normalize_product(doc), wanted)
 
 
 @router.post("/batch", summary="Get products by a list of SKUs")
-def get_products_batch(skus: List[str]):
-    col = products_collection()
-    docs = {d["_id"]: d for d in col.find({"_id": {"$in": skus}})}
-
-    return [
-        normalize_product(docs[s])
-        for s in skus
-        if s in docs
-    ]
+async def get_products_batch(skus: List[str], fields: str | None = FIELDS_QUERY, format: str = FORMAT_QUERY):
+    wanted = parse_fields(fields)
+    col = async_products_collection()
+    docs = {}
+    async for d in col.find({"_id": {"$in": skus}}, product_projection(wanted)):
+        sku = d["_id"]
+        docs[sku] = select_fields(normalize_product(d), wanted)
+
+    items = [docs[s] for s in skus if s in docs]
+    if format == "columnar":
+        return to_columnar(items, wanted)
+    return items
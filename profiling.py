@@ -0,0 +1,296 @@
+# profiling.py
+"""
+Opt-in profiling of live requests.
+
+Off unless PROFILE_ADMIN_TOKEN is set: the X-Profile header and the sampler
+are then ignored and /admin/profiling answers 404. With a token, the header
+and the admin routes need `X-Admin-Token: <token>` (403 otherwise).
+PROFILE_ENABLE=1 turns profiling on without a token, for local runs only.
+
+A request is profiled when it carries `X-Profile: 1` or is picked by the
+sampler (PROFILE_SAMPLE_RATE, optionally only for paths starting with
+PROFILE_PATH_PREFIX; both can be changed at runtime with PUT
+/admin/profiling/config).
+
+Profiled requests capture:
+  * a stack-sampling profile of every busy thread (the event loop and the
+    threadpool running sync routes) as folded stacks, the input format of
+    flamegraph.pl and speedscope
+  * cProfile's top functions on the event loop thread (async routes)
+  * tracemalloc's peak, net and top allocation sites during the request
+
+Only one request is profiled at a time, and other requests served
+concurrently show up in the samples and allocations too. tracemalloc
+slows everything down while it runs, so compare durations of profiled
+requests with each other, not with /metrics. Results are kept
+in a ring buffer of PROFILE_BUFFER_SIZE entries:
+
+    curl -H 'X-Profile: 1' -H "X-Admin-Token: $T" -i localhost:8000/recommend/user/42   # -> X-Profile-Id: 7
+    curl -H "X-Admin-Token: $T" localhost:8000/admin/profiling/7/folded | flamegraph.pl > user42.svg
+"""
+import cProfile
+import hmac
+import io
+import itertools
+import logging
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, deque
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+
+LOGGER = logging.getLogger(__name__)
+
+SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PATH_PREFIX = os.getenv("PROFILE_PATH_PREFIX", "")
+BUFFER_SIZE = int(os.getenv("PROFILE_BUFFER_SIZE", "32"))
+SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL", "0.002"))
+TRACEMALLOC_FRAMES = int(os.getenv("PROFILE_TRACEMALLOC_FRAMES", "8"))
+ADMIN_TOKEN = os.getenv("PROFILE_ADMIN_TOKEN", "")
+ENABLED = bool(ADMIN_TOKEN) or os.getenv("PROFILE_ENABLE", "") == "1"
+TOP_FUNCTIONS = 40
+TOP_ALLOCATIONS = 20
+
+# a thread whose innermost frame is in one of these is waiting, not working
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+class ProfilingConfig:
+    def __init__(self):
+        self.sample_rate = SAMPLE_RATE
+        self.path_prefix = PATH_PREFIX
+
+    def describe(self) -> dict:
+        return {"sample_rate": self.sample_rate, "path_prefix": self.path_prefix,
+                "buffer_size": BUFFER_SIZE, "sample_interval": SAMPLE_INTERVAL}
+
+
+config = ProfilingConfig()
+
+_profiles: "deque[dict]" = deque(maxlen=BUFFER_SIZE)
+_profiles_lock = threading.Lock()
+_ids = itertools.count(1)
+# one profiled request at a time: cProfile and tracemalloc are not per request
+_busy = threading.Lock()
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _StackSampler(threading.Thread):
+    """Counts the folded stacks of every non-idle thread every `interval` seconds."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._done.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            self.samples += 1
+            for tid, frame in sys._current_frames().items():
+                if tid == me or os.path.basename(frame.f_code.co_filename) in _IDLE_FILES:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(names.get(tid, str(tid)))
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._done.set()
+        self.join()
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+class _Capture:
+    """Everything collected for one request."""
+
+    def __init__(self):
+        self.sampler = _StackSampler(SAMPLE_INTERVAL)
+        self.profiler = cProfile.Profile()
+        self.started_tracemalloc = False
+        self.before = None
+        self.base = 0
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            self.started_tracemalloc = True
+        tracemalloc.reset_peak()
+        self.before = tracemalloc.take_snapshot()
+        self.base, _ = tracemalloc.get_traced_memory()
+        self.sampler.start()
+        self.profiler.enable()
+
+    def stop(self) -> dict:
+        self.profiler.disable()
+        self.sampler.stop()
+        current, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        diff = after.filter_traces(filters).compare_to(self.before.filter_traces(filters), "lineno")
+        top = [{"where": str(s.traceback), "size_kb": round(s.size_diff / 1024, 1), "count": s.count_diff}
+               for s in diff[:TOP_ALLOCATIONS] if s.size_diff > 0]
+
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+        return {
+            "samples": self.sampler.samples,
+            "sample_interval": self.sampler.interval,
+            "folded": self.sampler.folded(),
+            "cprofile": out.getvalue(),
+            "memory": {"peak_kb": round((peak - self.base) / 1024, 1),
+                       "net_kb": round((current - self.base) / 1024, 1),
+                       "top": top},
+        }
+
+
+def _authorized(token: Optional[str]) -> bool:
+    if ADMIN_TOKEN:
+        return token is not None and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode())
+    return ENABLED
+
+
+def _wanted(scope) -> bool:
+    if not ENABLED:
+        return False
+    headers = dict(scope.get("headers") or ())
+    if headers.get(b"x-profile", b"").lower() in (b"1", b"true", b"yes"):
+        token = headers.get(b"x-admin-token", b"").decode("latin-1") or None
+        return _authorized(token)
+    return (config.sample_rate > 0 and scope["path"].startswith(config.path_prefix)
+            and random.random() < config.sample_rate)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware; requests that are not profiled pay one header lookup."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wanted(scope) or not _busy.acquire(blocking=False):
+            await self.app(scope, receive, send)
+            return
+
+        profile_id = next(_ids)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"x-profile-id", str(profile_id).encode())
+                ]
+            await send(message)
+
+        capture = _Capture()
+        started_at = datetime.utcnow().isoformat()
+        start = time.perf_counter()
+        try:
+            capture.start()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            try:
+                result = capture.stop()
+                route = getattr(scope.get("route"), "path", None)
+                _store({"id": profile_id, "method": scope["method"], "path": scope["path"], "route": route,
+                        "query": scope.get("query_string", b"").decode("latin-1"), "status": status[0],
+                        "started_at": started_at, "duration_ms": round(elapsed * 1000, 3), **result})
+            except Exception:
+                LOGGER.exception("could not record profile %s", profile_id)
+            finally:
+                _busy.release()
+
+
+def _store(profile: dict):
+    with _profiles_lock:
+        _profiles.append(profile)
+
+
+def _find(profile_id: int) -> dict:
+    with _profiles_lock:
+        for p in _profiles:
+            if p["id"] == profile_id:
+                return p
+    raise HTTPException(status_code=404, detail=f"profile {profile_id} not found (the buffer keeps {BUFFER_SIZE})")
+
+
+# --------------------------------------------------------------------------- admin routes
+
+router = APIRouter(prefix="/admin/profiling", tags=["admin"])
+
+
+def _require_admin(token: Optional[str]):
+    if not ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not _authorized(token):
+        raise HTTPException(status_code=403, detail="invalid admin token")
+
+
+class ProfilingConfigUpdate(BaseModel):
+    sample_rate: Optional[float] = None
+    path_prefix: Optional[str] = None
+
+
+@router.get("/", summary="Profiling settings and the buffered profiles")
+def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    with _profiles_lock:
+        items = [{k: p[k] for k in ("id", "method", "path", "route", "status", "started_at", "duration_ms")}
+                 for p in reversed(_profiles)]
+    return {"config": config.describe(), "profiles": items}
+
+
+@router.put("/config", summary="Change the sampling rate / path prefix without a redeploy")
+def update_config(update: ProfilingConfigUpdate, x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    if update.sample_rate is not None:
+        if not 0 <= update.sample_rate <= 1:
+            raise HTTPException(status_code=400, detail="sample_rate must be between 0 and 1")
+        config.sample_rate = update.sample_rate
+    if update.path_prefix is not None:
+        config.path_prefix = update.path_prefix
+    return config.describe()
+
+
+@router.delete("/", summary="Drop the buffered profiles")
+def clear_profiles(x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    with _profiles_lock:
+        _profiles.clear()
+    return {"cleared": True}
+
+
+@router.get("/{profile_id}", summary="One profile: folded stacks, cProfile summary, allocations")
+def get_profile(profile_id: int, x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return _find(profile_id)
+
+
+@router.get("/{profile_id}/folded", summary="Folded stacks for flamegraph.pl / speedscope")
+def get_folded(profile_id: int, x_admin_token: Optional[str] = Header(None)):
+    _require_admin(x_admin_token)
+    return PlainTextResponse(_find(profile_id)["folded"])
@@ -3,45 +3,51 @@ from fastapi import APIRouter, HTTPException, Query
 from typing import List
 from collections import defaultdict
 from datetime import datetime
+import heapq
+import numpy as np
 
-# Import the *callable* collection accessors from your db module.
-# If your db.py exposes functions like products_collection(), neighbors_collection(), transactions_collection()
-# keep the parentheses when calling (e.g. products_collection()).
-from ..db import products_collection, neighbors_collection, transactions_collection
+# Import the *callable* async collection accessors from your db module
+# (pymongo's AsyncMongoClient, or the in-memory stand-in); keep the parentheses
+# and await the queries (e.g. await async_products_collection().find_one(...)).
+from ..db import async_products_collection, async_neighbors_collection, async_transactions_collection
+from ..neighbor_index import get_index
+from ..normalize import normalize_product
 
 router = APIRouter(prefix="/recommend", tags=["recommender"])
 
-def normalize_product(doc: dict) -> dict:
-    out = dict(doc)
-    out["sku"] = doc["_id"]
-
-    out["display_name"] = (
-        doc.get("name")
-        or doc.get("product_name")
-        or doc.get("title")
-        or str(doc["_id"])
-    )
-
-    del out["_id"]
-    return out
-
 @router.get("/sku/{sku}", summary="Recommend similar items for a SKU")
-def recommend_by_sku(sku: str, k: int = Query(8, ge=1, le=50)):
+async def recommend_by_sku(sku: str, k: int = Query(8, ge=1, le=50)):
     """
     Return top-k neighbors for a given SKU, with product metadata.
+    Served from the in-memory neighbor index; Mongo is only used until it is built.
     """
-    doc = neighbors_collection().find_one({"_id": sku})
+    index = get_index()
+    if index is not None:
+        found = index.neighbors(sku, k)
+        if found is None:
+            raise HTTPException(status_code=404, detail="neighbors not found")
+        results = []
+        for j, score in zip(found[0].tolist(), found[1].tolist()):
+            results.append({
+                "sku": index.skus[j],
+                "score": score,
+                # normalized once when the index was built
+                "product": index.products[j]
+            })
+        return {"sku": sku, "recommendations": results}
+
+    doc = await async_neighbors_collection().find_one({"_id": sku})
     if not doc or "neighbors" not in doc:
         raise HTTPException(status_code=404, detail="neighbors not found")
 
     neighbors = doc["neighbors"][:k]
     skus = [n["sku"] for n in neighbors]
 
-    prods_cursor = products_collection().find(
+    prods_cursor = async_products_collection().find(
         {"_id": {"$in": skus}},
         {"_id": 1, "name": 1, "images": 1, "category": 1, "mrp": 1}
     )
-    prods = list(prods_cursor)
+    prods = await prods_cursor.to_list(length=None)
     prod_map = {p["_id"]: p for p in prods}
 
     results = []
@@ -59,10 +65,82 @@ def recommend_by_sku(sku: str, k: int = Query(8, ge=1, le=50)):
     return {"sku": sku, "recommendations": results}
 
 
+def _score_from_index(index, bought_map: dict, k: int) -> List[str]:
+    """
+    Top-k of sum(qty * similarity) over the user's purchases, computed with
+    one gather over the CSR index, a scatter-add and an argpartition.
+    """
+    bought_ids = np.array(
+        [index.sku_to_idx[s] for s in bought_map if s in index.sku_to_idx],
+        dtype=np.intp,
+    )
+    rows = bought_ids[index.has_row[bought_ids]]
+    if len(rows) == 0:
+        return []
+    qty = np.array([bought_map[index.skus[i]] for i in rows], dtype=np.float64)
+
+    owner, nbrs, scores = index.gather(rows)
+    uniq, inv = np.unique(nbrs, return_inverse=True)
+    acc = np.bincount(inv, weights=qty[owner] * scores)
+
+    # exclude already bought
+    keep = ~np.isin(uniq, bought_ids)
+    uniq, acc = uniq[keep], acc[keep]
+
+    if len(acc) > k:
+        top = np.argpartition(-acc, k - 1)[:k]
+    else:
+        top = np.arange(len(acc))
+    top = top[np.argsort(-acc[top], kind="stable")]
+    return [index.skus[i] for i in uniq[top].tolist()]
+
+
+async def _score_from_mongo(bought_map: dict, k: int) -> List[str]:
+    """Fallback while the index is not built: one $in fetch for all neighbor docs."""
+    score = defaultdict(float)
+    cursor = async_neighbors_collection().find(
+        {"_id": {"$in": list(bought_map)}}, {"neighbors": 1}
+    )
+    async for nbr_doc in cursor:
+        if "neighbors" not in nbr_doc:
+            continue
+        qty = bought_map[nbr_doc["_id"]]
+        for nb in nbr_doc["neighbors"]:
+            score[nb["sku"]] += qty * float(nb.get("score", 0.0))
+
+    for sku in bought_map.keys():
+        score.pop(sku, None)
+
+    return [sku for sku, _ in heapq.nlargest(k, score.items(), key=lambda x: x[1])]
+
+
+async def _popular(index, exclude: List[str], needed: int) -> List[str]:
+    """Best sellers by units_sold, from the index's cached list when available."""
+    if needed <= 0:
+        return []
+    if index is None:
+        popular_cursor = async_products_collection().find(
+            {"_id": {"$nin": exclude}}, {"_id": 1}
+        ).sort("units_sold", -1).limit(needed)
+        return [p["_id"] async for p in popular_cursor]
+
+    skip = set(exclude)
+    out = []
+    for i in index.popular.tolist():
+        sku = index.skus[i]
+        if sku not in skip:
+            out.append(sku)
+            if len(out) == needed:
+                break
+    return out
+
+
 @router.get("/user/{user_id}", summary="Recommend products for user")
-def recommend_for_user(user_id: int, k: int = Query(10, gt=0, le=50)):
+async def recommend_for_user(user_id: int, k: int = Query(10, gt=0, le=50)):
     """
     Recommend products for a user by aggregating their purchases and scoring neighbors.
+    The only per-request Mongo query is the purchase aggregation; neighbors and
+    popularity come from the in-memory index.
     """
     # 1) aggregate user's purchases
     pipeline = [
@@ -70,40 +148,26 @@ def recommend_for_user(user_id: int, k: int = Query(10, gt=0, le=50)):
         {"$group": {"_id": "$sku", "qty": {"$sum": "$quantity"}}},
         {"$sort": {"qty": -1}}
     ]
-    bought = list(transactions_collection().aggregate(pipeline))
+    cursor = await async_transactions_collection().aggregate(pipeline)
+    bought = await cursor.to_list(length=None)
+    index = get_index()
     if not bought:
         # cold start -> popular items
-        pop_cursor = products_collection().find({}, {"_id": 1}).sort("units_sold", -1).limit(k)
-        popular_ids = [p["_id"] for p in pop_cursor]
         return {
             "user_id": user_id,
-            "recommendations": popular_ids,
+            "recommendations": await _popular(index, [], k),
             "computed_at": datetime.utcnow().isoformat()
         }
 
-    # 2) score neighbors by qty * similarity
-    score = defaultdict(float)
+    # 2) score neighbors by qty * similarity, 3) excluding already bought
     bought_map = {b["_id"]: b["qty"] for b in bought}
-    for sku, qty in bought_map.items():
-        nbr_doc = neighbors_collection().find_one({"_id": sku})
-        if not nbr_doc or "neighbors" not in nbr_doc:
-            continue
-        for nb in nbr_doc["neighbors"]:
-            score[nb["sku"]] += qty * float(nb.get("score", 0.0))
+    if index is not None:
+        sorted_skus = _score_from_index(index, bought_map, k)
+    else:
+        sorted_skus = await _score_from_mongo(bought_map, k)
 
-    # 3) exclude already bought
-    for sku in bought_map.keys():
-        score.pop(sku, None)
-
-    # 4) sort and pad with popular if needed
-    sorted_skus = [sku for sku, _ in sorted(score.items(), key=lambda x: -x[1])]
-    if len(sorted_skus) < k:
-        needed = k - len(sorted_skus)
-        popular_cursor = products_collection().find(
-            {"_id": {"$nin": sorted_skus}}
-        ).sort("units_sold", -1).limit(needed)
-        popular_add = [p["_id"] for p in popular_cursor]
-        sorted_skus.extend(popular_add)
+    # 4) pad with popular if needed
+    sorted_skus.extend(await _popular(index, sorted_skus, k - len(sorted_skus)))
 
     return {
         "user_id": user_id,
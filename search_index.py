@@ -0,0 +1,210 @@
+# search_index.py
+import os
+import re
+import time
+import bisect
+import threading
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .db import db, products_collection
+from .normalize import normalize_product
+
+LOGGER = logging.getLogger(__name__)
+
+REFRESH_INTERVAL = float(os.getenv("SEARCH_INDEX_REFRESH", "300"))
+# "poll" (rebuild every interval) or "changestream" (rebuild after product changes)
+REFRESH_MODE = os.getenv("SEARCH_INDEX_MODE", "poll")
+
+# Fields that are searched; category also drives the facets
+SEARCH_FIELDS = ("name", "product_name", "title", "category")
+PRODUCT_PROJECTION = {"_id": 1, "name": 1, "product_name": 1, "title": 1,
+                      "category": 1, "mrp": 1, "images": 1, "units_sold": 1}
+MODES = ("prefix", "substring", "token")
+# changestream mode: batch bursts of writes into one rebuild
+CHANGE_DEBOUNCE = 5.0
+
+_TOKEN = re.compile(r"[0-9a-z]+")
+
+
+def tokenize(text) -> List[str]:
+    return _TOKEN.findall(str(text).lower()) if text else []
+
+
+class SearchIndex:
+    """
+    Immutable inverted index over the product catalog.
+
+    Doc ids are positions in the listing order of GET /products (units_sold
+    desc, _id asc), so a sorted posting list is already ranked and a page
+    is a slice. `postings[t]` is the sorted int32 doc ids containing token
+    t; `vocab` is the sorted token list for prefix ranges and substring
+    scans. `cat_codes[i]` indexes `categories` (-1 for none) for filtering
+    and facet counts. `products` are normalized and shared between
+    requests; do not mutate them.
+    """
+
+    def __init__(self, products: List[dict], postings: Dict[str, np.ndarray], cat_codes: np.ndarray,
+                 categories: List[str], built_at: float):
+        self.products = products
+        self.postings = postings
+        self.vocab = sorted(postings)
+        self.cat_codes = cat_codes
+        self.categories = categories
+        # the category filter is case-insensitive, so "Rice" and "rice" both match
+        self.category_codes: Dict[str, List[int]] = {}
+        for i, c in enumerate(categories):
+            self.category_codes.setdefault(c.lower(), []).append(i)
+        self.built_at = built_at
+
+    def __len__(self):
+        return len(self.products)
+
+    def _terms_matching(self, term: str, mode: str) -> List[str]:
+        if mode == "token":
+            return [term] if term in self.postings else []
+        if mode == "prefix":
+            lo = bisect.bisect_left(self.vocab, term)
+            hi = bisect.bisect_left(self.vocab, term + "\uffff")
+            return self.vocab[lo:hi]
+        return [t for t in self.vocab if term in t]
+
+    def match(self, q: str, mode: str = "prefix") -> np.ndarray:
+        """Ranked doc ids matching every query term (all docs for an empty query)."""
+        result = None
+        for term in dict.fromkeys(tokenize(q)):
+            tokens = self._terms_matching(term, mode)
+            if not tokens:
+                return np.empty(0, dtype=np.int32)
+            ids = self.postings[tokens[0]] if len(tokens) == 1 else \
+                np.unique(np.concatenate([self.postings[t] for t in tokens]))
+            result = ids if result is None else np.intersect1d(result, ids, assume_unique=True)
+            if len(result) == 0:
+                break
+        if result is None:
+            return np.arange(len(self.products), dtype=np.int32)
+        return result
+
+    def search(self, q: str = "", category: Optional[str] = None, mode: str = "prefix",
+               limit: int = 50, offset: int = 0) -> dict:
+        """
+        One page of matches plus category facets. Facet counts are taken
+        before the category filter, so the UI can show every category that
+        has hits for the text query.
+        """
+        ids = self.match(q, mode)
+        codes = self.cat_codes[ids]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.categories))
+        facets = [{"value": self.categories[c], "count": int(counts[c])}
+                  for c in np.argsort(-counts, kind="stable").tolist() if counts[c] > 0]
+        if category:
+            wanted = self.category_codes.get(category.lower().strip(), [])
+            ids = ids[np.isin(codes, wanted)]
+        page = ids[offset:offset + limit].tolist()
+        return {
+            "total": int(len(ids)),
+            "items": [self.products[i] for i in page],
+            "facets": {"category": facets},
+        }
+
+    def describe(self) -> dict:
+        return {"products": len(self.products), "tokens": len(self.vocab),
+                "categories": len(self.categories), "built_at": self.built_at}
+
+
+def build_index() -> SearchIndex:
+    """One products scan, in listing order, into a SearchIndex."""
+    cursor = products_collection().find({}, PRODUCT_PROJECTION).sort([("units_sold", -1), ("_id", 1)])
+    products: List[dict] = []
+    token_docs: Dict[str, List[int]] = {}
+    cat_idx: Dict[str, int] = {}
+    categories: List[str] = []
+    codes: List[int] = []
+    for i, doc in enumerate(cursor):
+        doc.pop("units_sold", None)
+        for t in {t for f in SEARCH_FIELDS for t in tokenize(doc.get(f))}:
+            token_docs.setdefault(t, []).append(i)
+        cat = doc.get("category")
+        if cat:
+            if cat not in cat_idx:
+                cat_idx[cat] = len(categories)
+                categories.append(cat)
+            codes.append(cat_idx[cat])
+        else:
+            codes.append(-1)
+        products.append(normalize_product(doc))
+    postings = {t: np.asarray(ids, dtype=np.int32) for t, ids in token_docs.items()}
+    return SearchIndex(products, postings, np.asarray(codes, dtype=np.int32), categories, time.time())
+
+
+_index: Optional[SearchIndex] = None
+_refresh_lock = threading.Lock()
+
+
+def get_index() -> Optional[SearchIndex]:
+    """The current snapshot, or None if it has not been (successfully) built."""
+    return _index
+
+
+def refresh() -> SearchIndex:
+    global _index
+    with _refresh_lock:
+        index = build_index()
+        _index = index
+        LOGGER.info("search index loaded: %s", index.describe())
+        return index
+
+
+class SearchIndexRefresher:
+    """
+    Daemon thread keeping the index current: rebuilds every `interval`
+    seconds ("poll"), or in "changestream" mode CHANGE_DEBOUNCE seconds
+    after products change (polling instead when there is no replica set).
+    """
+
+    def __init__(self, interval: float = REFRESH_INTERVAL, mode: str = REFRESH_MODE):
+        self.interval = interval
+        self.mode = mode
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="search-index", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        if self.mode == "changestream":
+            try:
+                self._tail()
+                return
+            except Exception:
+                LOGGER.exception("search index: change stream unavailable, polling instead")
+        while not self._stop.wait(self.interval):
+            self._refresh()
+
+    def _refresh(self):
+        try:
+            refresh()
+        except Exception:
+            LOGGER.exception("search index refresh failed")
+
+    def _tail(self):
+        dirty_since = None
+        with db.products.watch(max_await_time_ms=1000) as stream:
+            while not self._stop.is_set():
+                if stream.try_next() is not None and dirty_since is None:
+                    dirty_since = time.monotonic()
+                if dirty_since is not None and time.monotonic() - dirty_since >= CHANGE_DEBOUNCE:
+                    dirty_since = None
+                    self._refresh()
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.routes import crop_classifier as crop
+
+
+def _random_frame(order, n, seed=11):
+    rng = np.random.default_rng(seed)
+    lo = {f: min(v) for f, v in crop.EQUIVALENCE_GRID.items()}
+    hi = {f: max(v) for f, v in crop.EQUIVALENCE_GRID.items()}
+    # a little outside the slider ranges on both sides
+    return pd.DataFrame({f: rng.uniform(lo[f] - 10, hi[f] + 10, n) for f in order})
+
+
+@pytest.mark.parametrize("n", [1, crop.FOREST_MAX_ROWS, 2000])
+def test_compiled_model_matches_pipeline(serving, n):
+    entry = serving(crop.MODEL_NAME)
+    X = _random_frame(entry.compiled.order, n)
+    labels, proba = entry.compiled.predict(X.to_numpy(dtype=np.float64))
+    assert np.array_equal(proba, entry.model.predict_proba(X))
+    assert np.array_equal(labels, entry.model.predict(X))
+
+
+def test_compiled_forest_matches_estimator_across_chunks(serving):
+    compiled = serving(crop.MODEL_NAME).compiled
+    if compiled.forest is None:
+        pytest.skip("final estimator is not a forest")
+    # more rows than one chunk, ending in a partial one
+    n = 2 * crop.CompiledForest.CHUNK_ROWS + 7
+    X = compiled.transform(_random_frame(compiled.order, n, seed=3).to_numpy())
+    assert np.array_equal(compiled.forest.predict_proba(X), compiled.estimator.predict_proba(X))
+
+
+def test_matrix_uses_training_column_order(serving):
+    compiled = serving(crop.MODEL_NAME).compiled
+    row = {f: float(i) for i, f in enumerate(crop.REQUIRED_FEATURES)}
+    X = compiled.matrix([row])
+    assert X.shape == (1, len(crop.REQUIRED_FEATURES))
+    assert X[0].tolist() == [row[f] for f in compiled.order]
+
+
+@pytest.fixture
+def paths(serving, monkeypatch):
+    """(path, rows) for each final predict_proba the served crop model makes."""
+    compiled = serving(crop.MODEL_NAME).compiled
+    if compiled.forest is None:
+        pytest.skip("final estimator is not a forest")
+    used = []
+    for name, path in [("forest", compiled.forest), ("estimator", compiled.estimator)]:
+        def record(X, _name=name, _predict=path.predict_proba):
+            used.append((_name, len(X)))
+            return _predict(X)
+        monkeypatch.setattr(path, "predict_proba", record)
+    return used
+
+
+@pytest.mark.parametrize("size, path", [
+    (lambda limit: 1, "forest"),
+    (lambda limit: limit, "forest"),
+    (lambda limit: limit + 1, "estimator"),
+    (lambda limit: 10 * limit, "estimator"),
+], ids=["one", "limit", "limit+1", "10x"])
+def test_batch_size_picks_the_path(serving, paths, size, path):
+    compiled = serving(crop.MODEL_NAME).compiled
+    n = size(crop.FOREST_MAX_ROWS)
+    compiled.predict(_random_frame(compiled.order, n).to_numpy())
+    assert paths == [(path, n)]
+
+
+def test_batch_route_picks_the_path(client, paths):
+    for n in (3, crop.FOREST_MAX_ROWS + 1):
+        rows = _random_frame(crop.REQUIRED_FEATURES, n).to_dict("records")
+        r = client.post("/crop/predict/batch", json={"rows": rows})
+        assert r.status_code == 200
+        assert len(r.json()["results"]) == n
+    assert paths == [("forest", 3), ("estimator", crop.FOREST_MAX_ROWS + 1)]
@@ -0,0 +1,113 @@
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import joblib
+import pytest
+from bson import ObjectId
+
+NAME = "toy"
+
+
+def _oid(seconds_from_now: float) -> ObjectId:
+    return ObjectId.from_datetime(datetime.now(timezone.utc) + timedelta(seconds=seconds_from_now))
+
+
+@pytest.fixture
+def disk_model(tmp_path):
+    """A local artifact written an hour ago; returns (path, version)."""
+    path = tmp_path / "toy.pkl"
+    joblib.dump({"from": "disk"}, path)
+    mtime = int(time.time()) - 3600
+    os.utime(path, (mtime, mtime))
+    return str(path), f"disk:{mtime}"
+
+
+@pytest.fixture
+def gridfs_loads(monkeypatch):
+    """Serve db.models docs from their `payload` field instead of GridFS."""
+    from app import models_loader
+
+    def load(doc):
+        if doc.get("broken"):
+            raise RuntimeError("corrupt upload")
+        return doc["payload"]
+
+    monkeypatch.setattr(models_loader, "load_from_gridfs_doc", load)
+    return load
+
+
+@pytest.fixture
+def registry(disk_model):
+    from app.model_registry import ModelRegistry
+
+    reg = ModelRegistry()
+    reg.register(NAME, disk_model[0])
+    return reg
+
+
+def test_doc_is_newer():
+    from app.models_loader import doc_is_newer
+
+    hour_ago = f"disk:{int(time.time()) - 3600}"
+    older, newer = _oid(-7200), _oid(0)
+    assert doc_is_newer({"_id": newer}, hour_ago)
+    assert not doc_is_newer({"_id": older}, hour_ago)
+    assert doc_is_newer({"_id": newer}, str(older))
+    assert not doc_is_newer({"_id": older}, str(newer))
+    assert not doc_is_newer({"_id": newer}, str(newer))
+    assert doc_is_newer({"_id": newer}, None)
+
+
+def test_reload_prefers_newer_upload(db, registry, gridfs_loads):
+    doc_id = db.models.insert_one({"_id": _oid(0), "name": NAME, "payload": {"from": "gridfs"}}).inserted_id
+    entry = registry.reload(NAME)
+    assert entry.version == str(doc_id)
+    assert entry.model == {"from": "gridfs"}
+
+
+def test_reload_keeps_newer_disk_file(db, registry, disk_model, gridfs_loads):
+    db.models.insert_one({"_id": _oid(-7200), "name": NAME, "payload": {"from": "gridfs"}})
+    entry = registry.reload(NAME)
+    assert entry.version == disk_model[1]
+    assert entry.model == {"from": "disk"}
+
+
+def test_broken_upload_falls_back_to_disk(db, registry, disk_model, gridfs_loads):
+    db.models.insert_one({"_id": _oid(0), "name": NAME, "broken": True})
+    assert registry.reload(NAME).version == disk_model[1]
+
+
+def test_watcher_seed_installs_newer_upload_once(db, registry, disk_model, gridfs_loads):
+    from app.model_watcher import ModelWatcher
+
+    registry.load_all()
+    assert registry.version(NAME) == disk_model[1]
+    doc_id = db.models.insert_one({"_id": _oid(0), "name": NAME, "payload": {"from": "gridfs"}}).inserted_id
+
+    watcher = ModelWatcher(registry, interval=0, load_doc=gridfs_loads)
+    watcher.seed()
+    assert registry.version(NAME) == str(doc_id)
+    # a reload and the next poll agree on the same version
+    assert registry.reload(NAME).version == str(doc_id)
+    assert watcher.poll_once() == []
+
+
+def test_watcher_ignores_upload_older_than_loaded_version(db, registry, disk_model, gridfs_loads):
+    from app.model_watcher import ModelWatcher
+
+    registry.load_all()
+    db.models.insert_one({"_id": _oid(-7200), "name": NAME, "payload": {"from": "gridfs"}})
+    watcher = ModelWatcher(registry, interval=0, load_doc=gridfs_loads)
+    watcher.seed()
+    assert watcher.poll_once() == []
+    assert registry.version(NAME) == disk_model[1]
+
+
+def test_swap_listeners_run_on_install(registry):
+    swapped = []
+    registry.subscribe(swapped.append)
+    registry.load_all()
+    registry.install(NAME, "v2", {"from": "test"})
+    assert swapped == [NAME, NAME]
+    assert registry.get(NAME).version == "v2"
@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+import pytest
+
+# a few GridFS chunks plus a partial one
+BLOB = os.urandom(3 * 255 * 1024 + 1234)
+
+
+@pytest.fixture
+def uploaded(client, db):
+    r = client.post("/models/upload", params={"name": "blob"},
+                    files={"file": ("blob.bin", BLOB, "application/octet-stream")})
+    assert r.status_code == 200
+    return r.json()["file_id"]
+
+
+def test_full_download(client, uploaded):
+    r = client.get(f"/models/download/{uploaded}")
+    assert r.status_code == 200
+    assert r.content == BLOB
+    assert r.headers["content-length"] == str(len(BLOB))
+    assert r.headers["etag"] == f'"{hashlib.md5(BLOB).hexdigest()}"'
+    assert r.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize("spec, start, end", [
+    ("bytes=0-9", 0, 9),
+    ("bytes=261000-261200", 261000, 261200),  # crosses a chunk boundary
+    ("bytes=-100", len(BLOB) - 100, len(BLOB) - 1),
+    ("bytes=700000-", 700000, len(BLOB) - 1),
+    (f"bytes=10-{10 ** 9}", 10, len(BLOB) - 1),
+])
+def test_range(client, uploaded, spec, start, end):
+    r = client.get(f"/models/download/{uploaded}", headers={"Range": spec})
+    assert r.status_code == 206
+    assert r.content == BLOB[start:end + 1]
+    assert r.headers["content-range"] == f"bytes {start}-{end}/{len(BLOB)}"
+
+
+def test_unsatisfiable_range(client, uploaded):
+    r = client.get(f"/models/download/{uploaded}", headers={"Range": f"bytes={len(BLOB)}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(BLOB)}"
+
+
+@pytest.mark.parametrize("spec", ["bytes=0-1,5-9", "items=0-9", "bytes=9-1"])
+def test_unsupported_range_serves_whole_file(client, uploaded, spec):
+    r = client.get(f"/models/download/{uploaded}", headers={"Range": spec})
+    assert r.status_code == 200
+    assert r.content == BLOB
+
+
+def test_if_none_match(client, uploaded):
+    etag = client.get(f"/models/download/{uploaded}").headers["etag"]
+    assert client.get(f"/models/download/{uploaded}", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get(f"/models/download/{uploaded}", headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get(f"/models/download/{uploaded}", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_if_range_with_stale_etag_serves_whole_file(client, uploaded):
+    etag = client.get(f"/models/download/{uploaded}").headers["etag"]
+    fresh = client.get(f"/models/download/{uploaded}", headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert fresh.status_code == 206
+    stale = client.get(f"/models/download/{uploaded}", headers={"Range": "bytes=0-9", "If-Range": '"old"'})
+    assert stale.status_code == 200
+    assert stale.content == BLOB
+
+
+def test_unknown_file_is_404(client):
+    assert client.get("/models/download/0123456789abcdef01234567").status_code == 404
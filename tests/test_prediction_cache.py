@@ -0,0 +1,123 @@
+import pytest
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.monotonic() for the cache module."""
+    from app import prediction_cache
+
+    now = [1000.0]
+    monkeypatch.setattr(prediction_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _cache(**kwargs):
+    from app.prediction_cache import PredictionCache
+
+    return PredictionCache("test", ["model_a"], **kwargs)
+
+
+def test_hit_until_ttl_then_miss(clock):
+    from app.prediction_cache import MISS
+
+    cache = _cache(maxsize=10, ttl=5)
+    cache.put(("k",), 1)
+    clock[0] += 4.9
+    assert cache.get(("k",)) == 1
+    clock[0] += 0.2
+    assert cache.get(("k",)) is MISS
+    assert cache.stats()["size"] == 0
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_is_evicted(clock):
+    from app.prediction_cache import MISS
+
+    cache = _cache(maxsize=2, ttl=60)
+    cache.put(("a",), 1)
+    cache.put(("b",), 2)
+    cache.get(("a",))
+    cache.put(("c",), 3)
+    assert cache.get(("b",)) is MISS
+    assert cache.get(("a",)) == 1
+    assert cache.evictions == 1
+
+
+def test_swap_of_a_watched_model_clears_it(clock):
+    from app.prediction_cache import MISS
+
+    cache = _cache(maxsize=10, ttl=60)
+    cache.put(("k",), 1)
+    cache.on_model_swap("unrelated")
+    assert cache.get(("k",)) == 1
+    cache.on_model_swap("model_a")
+    assert cache.get(("k",)) is MISS
+    assert cache.invalidations == 1
+
+
+def test_zero_size_disables_caching():
+    from app.prediction_cache import MISS
+
+    cache = _cache(maxsize=0, ttl=60)
+    cache.put(("k",), 1)
+    assert cache.get(("k",)) is MISS
+
+
+def test_quantize_merges_float_noise():
+    from app.prediction_cache import quantize
+
+    assert quantize(90) == quantize(90.0) == quantize(90.0000001)
+    assert quantize(90.01) != quantize(90.0)
+
+
+def test_registry_install_invalidates_route_cache(client):
+    from app.model_registry import registry
+    from app.prediction_cache import MISS, get_cache
+    from app.routes.crop_classifier import MODEL_NAME
+
+    features = {"N": 90, "P": 42, "K": 43, "temperature": 20.8, "humidity": 82, "ph": 6.5, "rainfall": 202}
+    cache = get_cache("crop")
+    first = client.post("/crop/predict", json={"features": features}).json()
+    hits = cache.hits
+    assert client.post("/crop/predict", json={"features": features}).json() == first
+    assert cache.hits == hits + 1
+
+    entry = registry.get(MODEL_NAME)
+    registry.install(MODEL_NAME, entry.version, entry.model)
+    assert cache.stats()["size"] == 0
+    assert client.post("/crop/predict", json={"features": features}).json() == first
+    assert cache.hits == hits + 1
+
+
+def test_peek_does_not_count_or_reorder(clock):
+    from app.prediction_cache import MISS
+
+    cache = _cache(maxsize=2, ttl=5)
+    cache.put(("a",), 1)
+    cache.put(("b",), 2)
+    assert cache.peek(("a",)) == 1
+    assert cache.peek(("x",)) is MISS
+    assert (cache.hits, cache.misses) == (0, 0)
+    cache.put(("c",), 3)
+    assert cache.peek(("a",)) is MISS  # still least recently used
+    clock[0] += 6
+    assert cache.peek(("b",)) is MISS
+
+
+@pytest.mark.parametrize("name, path, body", [
+    ("crop", "/crop/predict",
+     {"features": {"N": 61, "P": 17, "K": 29, "temperature": 23.3, "humidity": 71, "ph": 6.1, "rainfall": 97}}),
+    ("price", "/price/predict", None),
+])
+def test_route_counts_one_miss_per_computed_prediction(client, name, path, body):
+    from app.prediction_cache import get_cache
+
+    if body is None:
+        states = client.get("/price/states").json()["states"]
+        categories = client.get("/price/categories").json()["categories"]
+        body = {"mrp": 321.5, "month": 5, "units_sold": 17, "category": categories[0], "state": states[0]}
+    cache = get_cache(name)
+    hits, misses = cache.hits, cache.misses
+    for _ in range(3):
+        assert client.post(path, json=body).status_code == 200
+    assert (cache.hits - hits, cache.misses - misses) == (2, 1)
@@ -0,0 +1,84 @@
+import json
+import os
+import random
+
+import joblib
+import pytest
+from fastapi import HTTPException
+
+from app.routes import price
+
+
+def _requests(artifact, n=300, seed=7):
+    rng = random.Random(seed)
+    categories, states = (list(map(str, c)) for c in artifact["encoder"].categories_)
+    return [
+        price.PriceRequest(
+            # every tenth row exercises the imputer
+            mrp=float("nan") if i % 10 == 0 else rng.uniform(1, 5000),
+            month=rng.randint(1, 12),
+            units_sold=float(rng.randint(0, 3000)),
+            category=rng.choice(categories),
+            state=rng.choice(states),
+        )
+        for i in range(n)
+    ]
+
+
+def test_compiled_matches_pandas_path(serving):
+    entry = serving(price.MODEL_NAME)
+    for req in _requests(entry.model):
+        assert entry.compiled.predict(req) == price.predict_with_artifact(entry.model, req), req
+
+
+def test_compiled_unknown_category_matches_pandas_path(serving):
+    entry = serving(price.MODEL_NAME)
+    state = str(entry.model["encoder"].categories_[1][0])
+    req = price.PriceRequest(mrp=120.0, month=3, units_sold=40.0, category="__unseen__", state=state)
+    if entry.compiled.unknown is None:
+        with pytest.raises(HTTPException):
+            entry.compiled.predict(req)
+    else:
+        assert entry.compiled.predict(req) == price.predict_with_artifact(entry.model, req)
+
+
+def test_compiled_row_is_contiguous_float32(serving):
+    entry = serving(price.MODEL_NAME)
+    row = entry.compiled.row(_requests(entry.model, n=1)[0])
+    assert row.dtype.name == "float32"
+    assert row.shape == (1, len(entry.model["features"]))
+    assert row.flags.c_contiguous
+
+
+def test_nthread_is_set_without_the_compiled_path(monkeypatch):
+    from app.inference import XGB_NTHREAD
+    from app.model_registry import registry
+
+    def refuse(artifact):
+        raise ValueError("not compilable")
+
+    monkeypatch.setitem(registry._compilers, price.MODEL_NAME, refuse)
+    current = registry.get(price.MODEL_NAME)
+    fresh = joblib.load(os.environ["PRICE_MODEL_PATH"])
+    try:
+        entry = registry.install(price.MODEL_NAME, "uncompiled", fresh)
+        assert entry.compiled is None
+        config = json.loads(entry.model["xgb_model"].save_config())
+        assert config["learner"]["generic_param"]["nthread"] == str(XGB_NTHREAD)
+    finally:
+        monkeypatch.undo()
+        assert registry.install(price.MODEL_NAME, current.version, current.model).compiled is not None
+
+
+@pytest.mark.parametrize("body, status", [
+    ({"mrp": [1.0, 2.0], "month": [1], "units_sold": [1.0], "category": ["a"], "state": ["b"]}, 400),
+    ({"mrp": [1.0]}, 400),
+    ({"mrp": [1.0] * 4, "month": [1] * 4, "units_sold": [1.0] * 4, "category": ["a"] * 4, "state": ["b"] * 4}, 413),
+])
+def test_bad_batches_are_refused_before_the_executor(client, monkeypatch, body, status):
+    async def no_slot(*args):
+        raise AssertionError("took an inference slot")
+
+    monkeypatch.setattr(price, "BATCH_MAX_ROWS", 3)
+    monkeypatch.setattr(price.executor, "run", no_slot)
+    assert client.post("/price/predict/batch", json=body).status_code == status
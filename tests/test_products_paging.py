@@ -0,0 +1,71 @@
+import pytest
+
+
+def _expected_order(docs):
+    """Mongo's order for LIST_SORT: units_sold descending (null/missing last), then _id."""
+    with_units = sorted((d for d in docs if d.get("units_sold") is not None),
+                        key=lambda d: (-d["units_sold"], d["_id"]))
+    without = sorted((d for d in docs if d.get("units_sold") is None), key=lambda d: d["_id"])
+    return [d["_id"] for d in with_units + without]
+
+
+@pytest.fixture
+def products(db):
+    docs = []
+    for i in range(57):
+        doc = {"_id": f"SKU{i:03d}", "name": f"Product {i}", "category": "rice"}
+        if i % 7 == 0:
+            pass  # no units_sold at all
+        elif i % 5 == 0:
+            doc["units_sold"] = None
+        else:
+            doc["units_sold"] = (i * 13) % 9  # plenty of ties
+        docs.append(doc)
+    db.products.insert_many([dict(d) for d in docs])
+    return docs
+
+
+def _walk(client, limit, **params):
+    seen, cursor, pages = [], "", 0
+    while cursor is not None:
+        body = client.get("/products/", params={"limit": limit, "cursor": cursor, **params}).json()
+        seen += [item["sku"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        pages += 1
+        assert pages < 100
+    return seen
+
+
+def test_cursor_round_trip():
+    from app.routes.products import decode_cursor, encode_cursor
+
+    query = decode_cursor(encode_cursor({"_id": "SKU1", "units_sold": 42}))
+    assert {"units_sold": 42, "_id": {"$gt": "SKU1"}} in query["$or"]
+    assert {"units_sold": {"$lt": 42}} in query["$or"]
+
+
+def test_cursor_after_null_sort_key_only_tie_breaks_on_id():
+    from app.routes.products import decode_cursor, encode_cursor
+
+    assert decode_cursor(encode_cursor({"_id": "SKU9"})) == {"units_sold": None, "_id": {"$gt": "SKU9"}}
+
+
+@pytest.mark.parametrize("token", ["not base64 !", "bm90IGpzb24", "WzFd"])
+def test_invalid_cursor_is_400(client, token):
+    assert client.get("/products/", params={"cursor": token}).status_code == 400
+
+
+@pytest.mark.parametrize("limit", [1, 4, 10, 57, 100])
+def test_walk_visits_every_product_once_in_order(client, products, limit):
+    assert _walk(client, limit) == _expected_order(products)
+
+
+def test_walk_matches_skip_limit_listing(client, products):
+    listed = [item["sku"] for item in client.get("/products/", params={"limit": 1000}).json()]
+    assert _walk(client, 8) == listed
+
+
+def test_last_page_has_no_cursor(client, products):
+    r = client.get("/products/", params={"limit": 1000, "cursor": ""})
+    assert r.json()["next_cursor"] is None
+    assert "X-Next-Cursor" not in r.headers